@@ -1,431 +1,190 @@
 import os
 import time
 import datetime
-import pickle
 import json
-import glob
 import threading
-import math
-import fitz  # PyMuPDF
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-
-# Selenium
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-#from webdriver_manager.chrome import ChromeDriverManager
-
-# Google Calendar API
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
+import queue
+import uuid
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, send_file, abort
+
+# Google (logowanie OAuth w panelu)
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+
+from config import (SCOPES, CREDENTIALS_FILE, SCRAPER_BACKENDS, WASTE_COLORS,
+                    JOB_WORKERS, JOB_HISTORY, JOB_THROUGHPUT_WINDOW, PROGRESS_HEARTBEAT, ICS_MAX_AGE)
+from progress import IDLE_PROGRESS, progress_lock, _job_local, progress_bus, update_progress
+from state import state_store, load_state, address_key, address_id, sync_counters, sync_counters_lock
+from google_auth import credential_manager, get_google_creds, token_path
+from pipeline import run_full_process
+from metrics import registry, profile_run, profile_paths, PROFILERS, ICS_REQUESTS
+from ics_feed import ics_cache
+from scheduler import WakeScheduler
 
 app = Flask(__name__)
 # KLUCZOWE DLA LOGOWANIA:
 app.secret_key = 'bardzo_tajny_klucz_sesji_zmien_mnie_na_losowy_ciag'
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1' # Pozwala na logowanie bez HTTPS (lokalnie)
 
-# --- KONFIGURACJA ---
-TARGET_URL = "https://warszawa19115.pl/harmonogramy-wywozu-odpadow"
-SCOPES = ['https://www.googleapis.com/auth/calendar']
-CALENDAR_NAME = "Wywóz Śmieci"
-CREDENTIALS_FILE = "credentials.json"
-TOKEN_FILE = "token.pickle"
-STATE_FILE = "last_state.json"
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-STATIC_DIR = os.path.join(BASE_DIR, 'static')
-if not os.path.exists(STATIC_DIR):
-    os.makedirs(STATIC_DIR)
-
-MONTH_MAP = {
-    'stycznia': 1, 'lutego': 2, 'marca': 3, 'kwietnia': 4, 'maja': 5, 'czerwca': 6,
-    'lipca': 7, 'sierpnia': 8, 'września': 9, 'października': 10, 'listopada': 11, 'grudnia': 12,
-    'styczeń': 1, 'luty': 2, 'marzec': 3, 'kwiecień': 4, 'maj': 5, 'czerwiec': 6,
-    'lipiec': 7, 'sierpień': 8, 'wrzesień': 9, 'październik': 10, 'listopad': 11, 'grudzień': 12
-}
-
-WASTE_COLORS = {
-    "Papier": "7", 
-    "Metale i tworzywa sztuczne": "5", 
-    "Szkło": "10",
-    "Bio": "8", 
-    "Zmieszane": "8", 
-    "Zielone": "2"
-}
-
-# --- GLOBALNY STAN POSTĘPU ---
-progress_state = {
-    "status": "idle",
-    "percent": 0,
-    "message": "Gotowy",
-    "result": None
-}
-progress_lock = threading.Lock()
-
-def update_progress(percent, message, status="running"):
-    with progress_lock:
-        progress_state["percent"] = percent
-        progress_state["message"] = message
-        progress_state["status"] = status
-
-def reset_progress():
-    with progress_lock:
-        progress_state["percent"] = 0
-        progress_state["message"] = "Inicjalizacja..."
-        progress_state["status"] = "running"
-        progress_state["result"] = None
-
-# --- LOGIKA PDF I HELPERY ---
-
-def color_distance(c1, c2):
-    return math.sqrt(sum((a - b) ** 2 for a, b in zip(c1, c2)))
-
-def find_matching_fraction(pix, bbox, legend):
-    start_x = max(0, int(bbox.x0) + 2)
-    end_x = min(pix.width, int(bbox.x1) - 2)
-    start_y = max(0, int(bbox.y0) + 2)
-    end_y = min(pix.height, int(bbox.y1) - 2)
-    if start_x >= end_x or start_y >= end_y: return None
-    for x in range(start_x, end_x, 2):
-        for y in range(start_y, end_y, 2):
-            pixel_color = pix.pixel(x, y)
-            if sum(pixel_color) > 700: continue 
-            for item in legend:
-                if color_distance(pixel_color, item["color"]) < 45: return item["name"]
-    return None
-
-def process_pdf_labels(input_pdf_path, output_pdf_path):
-    try:
-        doc = fitz.open(input_pdf_path)
-        FONT_SIZE = 10
-        font_path = "C:/Windows/Fonts/arialbd.ttf"
-        if not os.path.exists(font_path): font_path = "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf"
-        custom_font = None
-        use_custom_font = False
-        if os.path.exists(font_path):
-            try: custom_font = fitz.Font(fontfile=font_path); use_custom_font = True
-            except: pass
-        legend = [
-            {"name": "ZIELONE", "color": (83, 88, 90)}, {"name": "ZMIESZANE", "color": (33, 35, 35)},
-            {"name": "PAPIER", "color": (0, 95, 170)}, {"name": "SZKŁO", "color": (45, 160, 45)},
-            {"name": "PLASTIK", "color": (255, 205, 0)}, {"name": "PLASTIK", "color": (245, 170, 0)},
-            {"name": "PLASTIK", "color": (230, 150, 0)}, {"name": "SKIP", "color": (140, 90, 60)}, 
-            {"name": "SKIP", "color": (110, 70, 40)}, {"name": "SKIP", "color": (230, 90, 20)}, 
-        ]
-        for page in doc:
-            pix = page.get_pixmap()
-            images = page.get_image_info(xrefs=True)
-            legend_y = page.rect.height * 0.9
-            writer = fitz.TextWriter(page.rect)
-            page_icons = []
-            for img in images:
-                bbox = fitz.Rect(img['bbox'])
-                if bbox.width < 8 or bbox.width > 80: continue
-                if bbox.y0 > legend_y: continue
-                lbl = find_matching_fraction(pix, bbox, legend)
-                if lbl: page_icons.append({"rect": bbox, "label": lbl})
-            for icon in page_icons:
-                if icon["label"] == "SKIP": continue
-                txt = icon["label"]
-                tlen = custom_font.text_length(txt, fontsize=FONT_SIZE) if use_custom_font else fitz.get_text_length(txt, fontsize=FONT_SIZE, fontname="Helvetica-Bold")
-                right = icon["rect"].x0 - 5
-                collision = True
-                while collision:
-                    collision = False
-                    trect = fitz.Rect(right - tlen, icon["rect"].y0, right, icon["rect"].y1)
-                    for obs in page_icons:
-                        if obs is icon: continue
-                        if trect.intersects(obs["rect"]):
-                            right = obs["rect"].x0 - 5; collision = True; break
-                fx, fy = right - tlen, icon["rect"].y1 - 2
-                if use_custom_font: writer.append((fx, fy), txt, font=custom_font, fontsize=FONT_SIZE)
-                else: page.insert_text((fx, fy), txt, fontsize=FONT_SIZE, fontname="Helvetica-Bold", color=(0,0,0))
-            if use_custom_font: writer.write_text(page, color=(0, 0, 0))
-        doc.save(output_pdf_path)
-        doc.close()
-        return True
-    except: return False
-
-def parse_polish_date(date_text):
-    try:
-        parts = date_text.lower().split()
-        if len(parts) < 2: return None
-        day = int(parts[0])
-        month = MONTH_MAP.get(parts[1])
-        if not month: return None
-        now = datetime.datetime.now()
-        year = now.year
-        if now.month >= 11 and month <= 2: year += 1
-        return datetime.date(year, month, day)
-    except: return None
-
-# --- AUTH & GOOGLE ---
-
-def get_google_creds():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        with open(TOKEN_FILE, 'rb') as token: creds = pickle.load(token)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
+# --- KOLEJKA ZADAŃ ---
+
+class Job:
+    def __init__(self, address, allowed_types, source="api", force=False, profile=None, user=None, calendar=True):
+        self.id = uuid.uuid4().hex[:12]
+        self.address = address
+        self.allowed_types = allowed_types
+        self.source = source
+        self.force = force
+        self.profile = profile  # None, "cprofile" albo "pyinstrument"
+        self.user = user  # gospodarstwo z własnym tokenem Google (None = domyślny TOKEN_FILE)
+        self.calendar = calendar  # False - tylko harmonogram i kanał ICS, bez Kalendarza Google
+        self.status = "queued"
+        self.percent = 0
+        self.message = "W kolejce..."
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def key(self):
+        return (address_key(self.address), tuple(sorted(self.allowed_types or [])), self.user, self.calendar)
+
+    def to_dict(self):
+        return {
+            "id": self.id, "address": self.address, "allowed_types": self.allowed_types, "source": self.source, "user": self.user, "calendar": self.calendar,
+            "status": self.status, "percent": self.percent, "message": self.message, "result": self.result,
+            "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            "profile_url": f"/api/jobs/{self.id}/profile" if self.profile else None,
+        }
+
+class JobQueue:
+    """Kolejka synchronizacji z ograniczoną liczbą równoległych workerów.
+    Identyczne zadania (adres + typy), które czekają lub trwają, są scalane."""
+
+    def __init__(self, workers, history=JOB_HISTORY, on_finished=None):
+        self.workers = workers
+        self.history = history
+        self.on_finished = on_finished  # on_finished(zadanie) - po zapisaniu wyniku, w wątku workera
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._pending = {}
+        self._finished_times = deque()
+        self._processed = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        if self._started: return
+        self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"sync-worker-{i}", daemon=True).start()
+
+    def submit(self, address, allowed_types, source="api", force=False, profile=None, user=None, calendar=True):
+        """Zwraca (zadanie, czy_nowe). Duplikat zwraca już zakolejkowane zadanie."""
+        job = Job(address, allowed_types, source, force, profile, user, calendar)
+        with self._lock:
+            existing = self._pending.get(job.key)
+            if existing: return existing, False
+            self._pending[job.key] = job
+            self._jobs[job.id] = job
+            self._prune()
+            self._ensure_workers()
+        self._queue.put(job)
+        return job, True
+
+    def _prune(self):
+        while len(self._jobs) > self.history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in ("queued", "running"): break
+            del self._jobs[oldest_id]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            _job_local.job = job
+            with progress_lock:
+                job.status = "running"
+                job.message = "Inicjalizacja..."
+                job.started_at = time.time()
+            progress_bus.publish(job.id, "progress", {"percent": job.percent, "message": job.message, "status": job.status})
             try:
-                creds.refresh(Request())
-                with open(TOKEN_FILE, 'wb') as token: pickle.dump(creds, token)
+                with profile_run(job.id, job.profile) if job.profile else nullcontext():
+                    result = run_full_process(job.address, job.allowed_types, force=job.force, user=job.user, calendar=job.calendar)
             except Exception as e:
-                print(f"Błąd odświeżania tokenu: {e}")
-                return None
-        else:
-            return None
-    return creds
-
-def get_google_service():
-    creds = get_google_creds()
-    if not creds: return None
-    return build('calendar', 'v3', credentials=creds)
-
-def load_state():
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-        except: pass
-    return {"schedule": [], "logs": [], "pdf_available": False, "pdf_labeled_available": False, "auto_mode": False, "last_auto_run": "", "saved_address": ""}
-
-def save_state(state):
-    try:
-        with open(STATE_FILE, 'w', encoding='utf-8') as f: json.dump(state, f, ensure_ascii=False)
-    except: pass
-
-# --- PROCES SYNCHRONIZACJI ---
-
-def run_full_process(address, allowed_types):
-    current_state = load_state()
-    results = {
-        "status": "success", "logs": [], "added_events": 0, "schedule": [],
-        "pdf_available": False, "pdf_labeled_available": False,
-        "auto_mode": current_state.get("auto_mode", False),
-        "last_auto_run": current_state.get("last_auto_run", ""),
-        "saved_address": address,
-        "allowed_types": allowed_types
-    }
-    def log(msg):
-        ts = datetime.datetime.now().strftime("%H:%M:%S")
-        print(f"[{ts}] {msg}")
-        results["logs"].append(f"[{ts}] {msg}")
-
-    try:
-        # Sprawdzamy auth na początku
-        service_google = get_google_service()
-        if not service_google:
-             raise Exception("Brak autoryzacji Google. Kliknij 'Połącz z Google' w panelu.")
-
-        update_progress(5, "Start przeglądarki...")
-        log(f"--- START DLA: {address} ---")
-        
-        chrome_options = Options()
-        chrome_options.add_argument("--headless=new")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--log-level=3")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        
-        prefs = {"download.default_directory": STATIC_DIR, "download.prompt_for_download": False, "plugins.always_open_pdf_externally": True}
-        chrome_options.add_experimental_option("prefs", prefs)
-        
-        # --- ZMIANA: WARUNKOWE UŻYCIE STEROWNIKA ---
-        # Na Dockerze (Linux) używamy systemowego. Na Windowsie - Webdriver Manager.
-        if os.path.exists("/usr/bin/chromium") and os.path.exists("/usr/bin/chromedriver"):
-            chrome_options.binary_location = "/usr/bin/chromium"
-            service = Service("/usr/bin/chromedriver")
-            log("Używam systemowego Chromium (Docker/Linux).")
-        else:
-            # Importujemy tylko tutaj, żeby Docker nie wywalił błędu przy starcie
-            from webdriver_manager.chrome import ChromeDriverManager
-            service = Service(ChromeDriverManager().install())
-            log("Używam Webdriver Manager (Windows/Local).")
-
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        log("Sterownik przeglądarki uruchomiony poprawnie.")
-        
-        schedule_data = [] 
-        try:
-            update_progress(10, "Pobieranie strony...")
-            log(f"Strona: {TARGET_URL}")
-            driver.get(TARGET_URL)
-            wait = WebDriverWait(driver, 20)
-            log("Strona załadowana.")
-
-            update_progress(15, "Akceptacja cookies...")
-            try:
-                consent = WebDriverWait(driver, 3).until(EC.element_to_be_clickable((By.XPATH, "//button[contains(.,'Zgoda na wszystkie')]")))
-                consent.click()
-                log("Zaakceptowano pliki cookie.")
-            except: 
-                log("Brak banera cookies.")
-
-            update_progress(20, "Szukanie adresu...")
-            input_el = wait.until(EC.element_to_be_clickable((By.ID, "addressAutoComplete")))
-            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", input_el)
-            input_el.clear()
-            input_el.send_keys(address)
-            time.sleep(1.5)
-
-            try:
-                suggestion = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "li.yui3-aclist-item")))
-                txt_sug = suggestion.text
-                suggestion.click()
-                log(f"Wybrano: {txt_sug}")
-            except: raise Exception("Brak podpowiedzi adresu!")
-
-            update_progress(30, "Pobieranie harmonogramu...")
-            wait.until(EC.element_to_be_clickable((By.ID, "buttonNext"))).click()
-            time.sleep(3)
-
-            # PDF
-            update_progress(40, "Pobieranie PDF...")
-            try:
-                for f in glob.glob(os.path.join(STATIC_DIR, "*.pdf")): os.remove(f)
-                wait.until(EC.element_to_be_clickable((By.ID, "downloadPdfLink"))).click()
-                timeout = 15
-                downloaded_file = None
-                while timeout > 0:
-                    files = glob.glob(os.path.join(STATIC_DIR, "*.pdf"))
-                    if files:
-                        downloaded_file = files[0]
-                        if not downloaded_file.endswith(".crdownload"): break
-                    time.sleep(1)
-                    timeout -= 1
-                if downloaded_file:
-                    original_pdf = os.path.join(STATIC_DIR, "harmonogram.pdf")
-                    labeled_pdf = os.path.join(STATIC_DIR, "harmonogram_opisany.pdf")
-                    if os.path.exists(original_pdf) and original_pdf != downloaded_file: os.remove(original_pdf)
-                    os.rename(downloaded_file, original_pdf)
-                    results["pdf_available"] = True
-                    log("Pobrano PDF.")
-                    update_progress(50, "Generowanie opisów PDF...")
-                    if process_pdf_labels(original_pdf, labeled_pdf):
-                        results["pdf_labeled_available"] = True
-                        log("PDF opisany pomyślnie.")
-            except Exception as e: log(f"Błąd PDF: {e}")
-
-            # HTML
-            update_progress(60, "Analiza danych...")
-            element_ids = {"paper-date": "Papier", "mixed-date": "Zmieszane", "metals-date": "Metale i tworzywa sztuczne", "glass-date": "Szkło", "bio-date": "Bio", "green-date": "Zielone"}
-            for html_id, waste_name in element_ids.items():
-                try:
-                    el = driver.find_element(By.ID, html_id)
-                    txt = el.text.strip()
-                    if txt:
-                        schedule_data.append((txt, waste_name))
-                        results["schedule"].append({"dateText": txt, "wasteType": waste_name})
-                        log(f" -> Znaleziono: {waste_name} ({txt})")
-                except: pass
-        finally:
-            driver.quit()
-
-        if not schedule_data: raise Exception("Brak dat na stronie")
-
-        # Calendar
-        update_progress(75, "Wysyłanie do Kalendarza...")
-        cal_id = None
-        page_token = None
-        while True:
-            clist = service_google.calendarList().list(pageToken=page_token).execute()
-            for e in clist['items']:
-                if e['summary'] == CALENDAR_NAME: cal_id = e['id']; break
-            if cal_id: break
-            page_token = clist.get('nextPageToken')
-            if not page_token: break
-        
-        if not cal_id:
-            cal_id = service_google.calendars().insert(body={'summary': CALENDAR_NAME, 'timeZone': 'Europe/Warsaw'}).execute()['id']
-            log("Utworzono nowy kalendarz.")
-
-        now_iso = datetime.datetime.utcnow().isoformat() + 'Z'
-        existing = service_google.events().list(calendarId=cal_id, timeMin=now_iso, singleEvents=True).execute().get('items', [])
-
-        count = 0
-        for i, (date_text, waste_type) in enumerate(schedule_data):
-            update_progress(80 + int((i/len(schedule_data))*15), f"Wysyłanie: {waste_type}...")
-            if waste_type not in allowed_types: 
-                log(f" -> Pominięto (filtr): {waste_type}")
-                continue
-            edate = parse_polish_date(date_text)
-            if not edate: continue
-            estr = edate.isoformat()
-            summary = f"Odbiór: {waste_type}"
-            
-            dup = False
-            for ev in existing:
-                if ev.get('start', {}).get('date') == estr and ev.get('summary') == summary: dup = True; break
-            
-            if not dup:
-                body = {
-                    'summary': summary, 'start': {'date': estr}, 'end': {'date': estr},
-                    'colorId': WASTE_COLORS.get(waste_type, "8"), 'transparency': 'transparent',
-                    'reminders': {'useDefault': False, 'overrides': [
-                        {'method': 'popup', 'minutes': 300},
-                        {'method': 'email', 'minutes': 300}
-                    ]}
-                }
-                service_google.events().insert(calendarId=cal_id, body=body).execute()
-                log(f" -> DODANO: {waste_type} ({estr})")
-                count += 1
-            else:
-                log(f" -> Duplikat: {waste_type}")
-
-        results["added_events"] = count
-        results['timestamp'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log(f"--- SUKCES: Dodano {count} wydarzeń ---")
-        
-        save_state(results)
-        
-        with progress_lock:
-            progress_state["percent"] = 100
-            progress_state["message"] = "Zakończono pomyślnie!"
-            progress_state["status"] = "finished"
-            progress_state["result"] = results
-
-    except Exception as e:
-        log(f"BŁĄD: {str(e)}")
-        with progress_lock:
-            progress_state["status"] = "error"
-            progress_state["message"] = str(e)
-            results["status"] = "error"
-            results["message"] = str(e)
-            progress_state["result"] = results
-        save_state(results)
-
-def auto_scheduler():
-    while True:
-        try:
-            state = load_state()
-            if state.get("auto_mode", False) and progress_state["status"] != "running":
-                today = datetime.date.today().isoformat()
-                if state.get("last_auto_run") != today:
-                    addr = state.get("saved_address")
-                    if addr and get_google_creds():
-                        yesterday = datetime.date.today() - datetime.timedelta(days=1)
-                        should_run = False
-                        for item in state.get("schedule", []):
-                            ed = parse_polish_date(item['dateText'])
-                            if ed and ed == yesterday: should_run = True; break
-                        
-                        if should_run:
-                            reset_progress()
-                            state['last_auto_run'] = today
-                            save_state(state)
-                            allowed_types = state.get("allowed_types", list(WASTE_COLORS.keys()))
-                            run_full_process(addr, allowed_types)
-            time.sleep(3600)
-        except: time.sleep(60)
-
-threading.Thread(target=auto_scheduler, daemon=True).start()
+                result = {"status": "error", "message": str(e), "logs": []}
+                update_progress(job.percent, str(e), "error")
+            finally:
+                _job_local.job = None
+            with progress_lock:
+                job.result = result
+                job.finished_at = time.time()
+                if job.status == "running": job.status = "finished" if result.get("status") == "success" else "error"
+                done = {"percent": job.percent, "message": job.message, "status": job.status, "run_id": result.get("run_id")}
+            progress_bus.publish(job.id, "done", done)
+            with self._lock:
+                self._pending.pop(job.key, None)
+                self._processed += 1
+                self._finished_times.append(job.finished_at)
+            if self.on_finished:
+                try: self.on_finished(job)
+                except Exception as e: print(f"Błąd obsługi zakończenia zadania {job.id}: {e}")
+
+    def get(self, job_id):
+        with self._lock: return self._jobs.get(job_id)
+
+    def latest(self):
+        with self._lock: return next(reversed(self._jobs.values()), None)
+
+    def is_busy(self, address=None):
+        with self._lock:
+            return any(address is None or key[0] == address_key(address) for key in self._pending)
+
+    def list(self):
+        with self._lock: jobs = list(self._jobs.values())
+        with progress_lock: return [{k: v for k, v in job.to_dict().items() if k != "result"} for job in jobs]
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            while self._finished_times and now - self._finished_times[0] > JOB_THROUGHPUT_WINDOW:
+                self._finished_times.popleft()
+            recent = len(self._finished_times)
+            statuses = [job.status for job in self._jobs.values()]
+            durations = [job.finished_at - job.started_at for job in self._jobs.values() if job.finished_at and job.started_at]
+        return {
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "processed_total": self._processed,
+            "throughput_per_min": round(recent / (JOB_THROUGHPUT_WINDOW / 60), 3),
+            "avg_duration_s": round(sum(durations) / len(durations), 3) if durations else None,
+        }
+
+job_queue = JobQueue(JOB_WORKERS)
+registry.gauge("waste_jobs", "Zadania synchronizacji w kolejce i w trakcie.", lambda: {(s,): job_queue.stats()[s] for s in ("queued", "running")}, ("status",))
+registry.gauge("waste_jobs_processed_total", "Zadania zakończone od startu aplikacji.", lambda: job_queue.stats()["processed_total"])
+
+def submit_auto(address, allowed_types, user=None, calendar=True):
+    state_store.set_settings(last_auto_run=datetime.date.today().isoformat())
+    # Tryb i konto Google gospodarstwa z ostatniego przebiegu adresu: adres tylko z ICS nie trafia do Kalendarza,
+    # a bez tokenu przebieg i tak odświeża harmonogram - dla kanału ICS (run_full_process)
+    job_queue.submit(address, allowed_types or list(WASTE_COLORS.keys()), source="auto", user=user, calendar=calendar)
+
+# Automat: po każdym zadaniu termin adresu liczony od nowa z zapisanego harmonogramu
+wake_scheduler = WakeScheduler(submit_auto)
+job_queue.on_finished = lambda job: wake_scheduler.plan(job.address)
+
+def start_background():
+    """Wątki działające w tle: automat i rozgrzewanie przeglądarek. Wywołuje je tylko punkt wejścia serwera -
+    import modułu (procesy puli opisywania PDF importują go ponownie jako __mp_main__, testy) niczego nie uruchamia.
+    Workery kolejki startują same przy pierwszym zadaniu."""
+    wake_scheduler.start()
+    # Przeglądarki rozgrzewamy tylko gdy Selenium jest głównym scraperem; jako zapas startują na żądanie
+    if SCRAPER_BACKENDS[:1] == ["selenium"]:
+        from browser import browser_pool
+        threading.Thread(target=browser_pool.warm, daemon=True).start()
 
 # --- ROUTES ---
 
@@ -433,8 +192,24 @@ threading.Thread(target=auto_scheduler, daemon=True).start()
 def home():
     return render_template('index.html')
 
+def request_user():
+    """Gospodarstwo z własnym tokenem Google: "user" w JSON, ?user= albo zapamiętane przy logowaniu w sesji."""
+    body = request.get_json(silent=True) or {}
+    user = body.get('user') or request.args.get('user') or session.get('user')
+    if not user: return None
+    try: token_path(user)
+    except ValueError as e: abort(400, str(e))
+    return user
+
 @app.route('/login')
 def login():
+    # /login?user=<nazwa> - osobny token dla kolejnego gospodarstwa; bez parametru konto domyślne.
+    # Nazwę sprawdzamy przed zapisem w sesji - błędna nie może zablokować kolejnych zapytań
+    user = request.args.get('user') or None
+    if user:
+        try: token_path(user)
+        except ValueError as e: abort(400, str(e))
+    session['user'] = user
     flow = Flow.from_client_secrets_file(
         CREDENTIALS_FILE,
         scopes=SCOPES,
@@ -455,37 +230,164 @@ def oauth2callback():
         redirect_uri=url_for('oauth2callback', _external=True)
     )
     flow.fetch_token(authorization_response=request.url)
-    with open(TOKEN_FILE, 'wb') as token: pickle.dump(flow.credentials, token)
+    credential_manager(session.get('user')).store(flow.credentials)
     return redirect(url_for('home'))
 
 @app.route('/api/auth-status')
 def auth_status():
-    return jsonify({"authenticated": get_google_creds() is not None})
+    user = request_user()
+    return jsonify({"authenticated": get_google_creds(user) is not None, "user": user})
 
 @app.route('/api/sync', methods=['POST'])
 def api_sync():
-    if not get_google_creds(): return jsonify({"status": "error", "message": "Brak logowania"})
-    if progress_state["status"] == "running": return jsonify({"status": "error", "message": "Proces trwa"})
-    reset_progress()
-    threading.Thread(target=run_full_process, args=(request.json.get('address'), request.json.get('allowedTypes'))).start()
-    return jsonify({"status": "started"})
+    user = request_user()
+    # "calendar": false - bez logowania Google; harmonogram trafia tylko do kanału ICS adresu
+    calendar = request.json.get('calendar', True) is not False
+    if calendar and not get_google_creds(user): return jsonify({"status": "error", "message": "Brak logowania"})
+    address = request.json.get('address')
+    if not address: return jsonify({"status": "error", "message": "Brak adresu"})
+    # force: synchronizuj z kalendarzem nawet gdy odcisk harmonogramu się nie zmienił
+    # ?profile=1 (cProfile) lub ?profile=pyinstrument: profil tego jednego przebiegu pod /api/jobs/<id>/profile
+    profile = request.args.get('profile')
+    if profile: profile = profile if profile in PROFILERS else "cprofile"
+    job, created = job_queue.submit(address, request.json.get('allowedTypes'), force=bool(request.json.get('force')), profile=profile, user=user, calendar=calendar)
+    return jsonify({"status": "started", "job_id": job.id, "deduplicated": not created, "ics_url": f"/ics/{address_id(address)}.ics"})
+
+@app.route('/api/sync/batch', methods=['POST'])
+def api_sync_batch():
+    """Body: {"items": [{"address": "...", "allowedTypes": [...]}, ...], "user": "..." (opcjonalnie)}"""
+    user = request_user()
+    if not get_google_creds(user): return jsonify({"status": "error", "message": "Brak logowania"})
+    items = request.json.get('items') or []
+    jobs = []
+    for item in items:
+        if not item.get('address'): continue
+        job, created = job_queue.submit(item['address'], item.get('allowedTypes', list(WASTE_COLORS.keys())), user=user)
+        jobs.append({"address": item['address'], "job_id": job.id, "deduplicated": not created})
+    return jsonify({"status": "started", "jobs": jobs})
 
 @app.route('/api/progress', methods=['GET'])
-def api_progress():
+@app.route('/api/progress/<job_id>', methods=['GET'])
+def api_progress(job_id=None):
+    # Bez id zwracamy ostatnie zadanie (zgodność ze starszym UI)
+    job_id = job_id or request.args.get('job')
+    job = job_queue.get(job_id) if job_id else job_queue.latest()
+    if job_id and not job: return jsonify({"status": "error", "message": "Nieznane zadanie"}), 404
+    if not job: return jsonify(IDLE_PROGRESS)
     with progress_lock:
-        return jsonify(progress_state)
+        return jsonify(job.to_dict())
+
+def sse_event(event, data, seq=None):
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/progress/stream', methods=['GET'])
+@app.route('/api/progress/<job_id>/stream', methods=['GET'])
+def api_progress_stream(job_id=None):
+    """Server-Sent Events: najpierw bieżący stan i bufor zdarzeń, potem tylko zmiany.
+    Wznowienie po zerwaniu przez nagłówek Last-Event-ID (EventSource robi to sam)."""
+    job_id = job_id or request.args.get('job')
+    job = job_queue.get(job_id) if job_id else job_queue.latest()
+    if not job: return jsonify({"status": "error", "message": "Nieznane zadanie"}), 404
+    try: last_seq = int(request.headers.get("Last-Event-ID") or request.args.get("last_id") or 0)
+    except ValueError: last_seq = 0
+
+    def stream():
+        q, backlog = progress_bus.subscribe(job.id, last_seq)
+        try:
+            with progress_lock:
+                snapshot = {"percent": job.percent, "message": job.message, "status": job.status, "job_id": job.id}
+                finished = job.finished_at is not None
+            yield sse_event("progress", snapshot)
+            for seq, event, data in backlog:
+                yield sse_event(event, data, seq)
+                if event == "done": return
+            if finished:
+                yield sse_event("done", snapshot)
+                return
+            while True:
+                try: seq, event, data = q.get(timeout=PROGRESS_HEARTBEAT)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield sse_event(event, data, seq)
+                if event == "done": return
+        finally:
+            progress_bus.unsubscribe(job.id, q)
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/api/jobs', methods=['GET'])
+def api_jobs():
+    return jsonify({"jobs": job_queue.list(), "stats": job_queue.stats()})
+
+@app.route('/api/jobs/<job_id>/profile', methods=['GET'])
+def api_job_profile(job_id):
+    """Raport profilu (tekst); ?raw=1 zwraca plik .prof (cProfile, np. dla snakeviz) lub .html (pyinstrument)."""
+    job = job_queue.get(job_id)
+    if job and job.finished_at is None: return jsonify({"status": "pending", "message": "Profil będzie dostępny po zakończeniu zadania"}), 202
+    report, raw = profile_paths(os.path.basename(job_id))
+    if not os.path.exists(report): return jsonify({"status": "error", "message": "Brak profilu dla zadania"}), 404
+    if request.args.get('raw') and raw: return send_file(raw, as_attachment=raw.endswith(".prof"))
+    return send_file(report, mimetype="text/plain")
+
+@app.route('/ics/<addr_id>.ics', methods=['GET'])
+def ics_feed(addr_id):
+    """Kanał iCalendar adresu do subskrypcji (adres URL z /api/sync lub /api/last-state).
+    Klienci wysyłający If-None-Match / If-Modified-Since dostają 304, dopóki harmonogram się nie zmieni."""
+    entry = ics_cache.get(os.path.basename(addr_id))
+    if not entry: return jsonify({"status": "error", "message": "Brak harmonogramu dla tego adresu"}), 404
+    resp = Response(entry["body"], mimetype="text/calendar")
+    resp.charset = "utf-8"
+    resp.set_etag(entry["etag"])
+    resp.last_modified = entry["last_modified"]
+    resp.cache_control.public = True
+    resp.cache_control.max_age = ICS_MAX_AGE
+    resp.headers["Content-Disposition"] = f'inline; filename="wywoz-{entry["etag"][:8]}.ics"'
+    resp = resp.make_conditional(request)
+    if resp.status_code == 304: ICS_REQUESTS.inc(result="not_modified")
+    return resp
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route('/api/sync-stats', methods=['GET'])
+def api_sync_stats():
+    with sync_counters_lock:
+        return jsonify(dict(sync_counters))
 
 @app.route('/api/toggle-auto', methods=['POST'])
 def toggle_auto():
     en = request.json.get('enable', False)
-    st = load_state()
-    st['auto_mode'] = en
-    save_state(st)
+    state_store.set_settings(auto_mode=en)
+    wake_scheduler.reload()
     return jsonify({"status": "success", "auto_mode": en})
 
+@app.route('/api/scheduler', methods=['GET'])
+def api_scheduler():
+    """Zaplanowane automatyczne przebiegi, od najbliższego."""
+    return jsonify({"auto_mode": bool(state_store.get_setting("auto_mode")), "upcoming": wake_scheduler.upcoming()})
+
 @app.route('/api/last-state', methods=['GET'])
 def last_state(): return jsonify(load_state())
 
+def page_args(default_limit, max_limit):
+    """limit/offset z zapytania: wartości nieliczbowe - domyślne, limit w 1..max_limit, offset >= 0."""
+    limit = max(1, min(request.args.get('limit', default_limit, type=int), max_limit))
+    return limit, max(0, request.args.get('offset', 0, type=int))
+
+@app.route('/api/runs', methods=['GET'])
+def api_runs():
+    limit, offset = page_args(20, 200)
+    return jsonify({"runs": state_store.list_runs(request.args.get('address'), limit, offset), "limit": limit, "offset": offset})
+
+@app.route('/api/runs/<int:run_id>/logs', methods=['GET'])
+def api_run_logs(run_id):
+    limit, offset = page_args(500, 5000)
+    return jsonify({"run_id": run_id, "logs": state_store.logs(run_id, limit, offset), "limit": limit, "offset": offset})
+
 if __name__ == '__main__':
+    start_background()
     # ssl_context='adhoc' generuje szybki certyfikat w locie
     app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False, ssl_context='adhoc')
\ No newline at end of file
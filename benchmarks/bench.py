@@ -0,0 +1,277 @@
+"""Benchmarki etapów scrape -> opis PDF -> kalendarz.
+
+    python benchmarks/bench.py                                   # wszystkie etapy, tabela wyników
+    python benchmarks/bench.py --quick --filter pdf_labels       # szybki przebieg wybranych etapów
+    python benchmarks/bench.py --save benchmarks/baseline.json   # zapis wyników jako punkt odniesienia
+    python benchmarks/bench.py --compare benchmarks/baseline.json --threshold 0.25
+
+Dla każdego etapu: percentyle czasu (p50/p90/p99), szczytowa pamięć z tracemalloc (tylko alokacje
+Pythona - bufory MuPDF i procesy potomne nie są widoczne) i przepustowość w jednostkach etapu na sekundę.
+Tryb --compare kończy się kodem 1, gdy któryś etap jest wolniejszy od zapisanego wyniku o więcej niż próg.
+Wszystko działa lokalnie: syntetyczne PDF, nagrane odpowiedzi portalu i atrapa Calendar API (fixtures.py).
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import tracemalloc
+from contextlib import nullcontext
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fixtures import make_schedule_pdf, dense_icons, load_recorded, rebase_dates, SiteStandIn, FakeCalendarService, calendar_events
+
+PDF_SIZES = [(1, 20), (1, 120), (4, 20), (4, 120), (12, 20), (12, 120)]
+PDF_SIZES_QUICK = [(1, 20), (1, 120), (4, 120)]
+# Skalowanie z liczbą stron: procesy puli x strony (120 ikon na stronę)
+PDF_WORKER_GRID = [1, 2, 4]
+PDF_PAGE_GRID = [1, 4, 12, 24]
+PDF_PAGE_GRID_QUICK = [4, 12]
+CALENDAR_SIZES = [200, 2000]
+DEFAULT_REPEAT = 15
+DEFAULT_MAX_SECONDS = 10
+
+def quiet(msg):
+    pass
+
+def no_step(name):
+    return nullcontext()
+
+# --- ETAPY ---
+# Fabryka etapów (ctx) zwraca kolejne (nazwa, jednostka, (prepare, run, jednostek_na_wywołanie)).
+# prepare() nie jest mierzone, jego wynik trafia jako argument do run().
+
+BENCHES = []
+
+def bench(fn):
+    BENCHES.append(fn)
+    return fn
+
+@bench
+def pdf_label_benches(ctx):
+    from pdf_labels import process_pdf_labels
+    sizes = PDF_SIZES_QUICK if ctx["quick"] else PDF_SIZES
+    out = os.path.join(ctx["tmp"], "opisany.pdf")
+    for pages, icons in sizes:
+        src = ctx["pdf"](pages, icons)
+        yield f"pdf_labels[p{pages}_i{icons}]", "stron", (None, lambda _, src=src: process_pdf_labels(src, out, workers=1), pages)
+    # Siatka workers x strony; przy 1 stronie (poniżej PDF_PARALLEL_MIN_PAGES) pula się nie uruchamia.
+    # Wariantów z większą liczbą procesów niż rdzeni nie pomijamy - nazwy etapów są stałe dla --compare.
+    for pages in PDF_PAGE_GRID_QUICK if ctx["quick"] else PDF_PAGE_GRID:
+        src = ctx["pdf"](pages, 120)
+        for workers in PDF_WORKER_GRID:
+            yield f"pdf_labels[p{pages}_w{workers}]", "stron", (None, lambda _, src=src, w=workers: process_pdf_labels(src, out, workers=w), pages)
+
+@bench
+def icon_benches(ctx):
+    import fitz
+    from pdf_labels import find_matching_fraction, classify_icons, detect_page_icons, layout_labels, make_text_width, PDF_LEGEND
+    doc = fitz.open(ctx["pdf"](1, 120))
+    page = doc[0]
+    pix = page.get_pixmap()
+    bboxes = [fitz.Rect(img["bbox"]) for img in page.get_image_info(xrefs=True) if 8 <= fitz.Rect(img["bbox"]).width <= 80]
+    icons = detect_page_icons(page)
+    text_width = make_text_width()
+    n = len(bboxes)
+    yield "find_matching_fraction[i120]", "ikon", (None, lambda _: [find_matching_fraction(pix, b, PDF_LEGEND) for b in bboxes], n)
+    yield "classify_icons[i120]", "ikon", (None, lambda _: classify_icons(pix, bboxes), n)
+    yield "layout_labels[i120]", "ikon", (None, lambda _: layout_labels(icons, text_width), len(icons))
+    # Gęste strony (30 wierszy) - tu widać koszt wyszukiwania kolizji
+    for count in (400, 1200):
+        dense = dense_icons(count)
+        yield f"layout_labels[dense_i{count}]", "ikon", (None, lambda _, d=dense: layout_labels(d, text_width), count)
+
+@bench
+def date_benches(ctx):
+    from dates import parse_polish_date, parse_schedule_dates, clear_date_cache
+    from scraper import MONTH_GENITIVE
+    items = load_recorded("schedule.json")[0]["harmonogramy"]
+    days = [datetime.date.fromisoformat(item["data"]) for item in items]
+    # Przypięta data odniesienia - wynik nie zależy od dnia uruchomienia
+    today = min(days)
+    texts = []
+    for i, d in enumerate(days):
+        day = f"{d.day} {MONTH_GENITIVE[d.month - 1]}"
+        # Formaty ze strony: z rokiem, bez roku (rok wnioskowany), zakres i kilka dat w jednym elemencie
+        texts.append([f"{day} {d.year}", day, f"{d.day}-{d.day + 1} {MONTH_GENITIVE[d.month - 1]}" if d.day < 28 else day, f"{d.day} i {min(d.day + 7, 28)} {MONTH_GENITIVE[d.month - 1]}"][i % 4])
+    schedule = [(t, "Papier") for t in texts]
+    yield f"parse_polish_date[{len(texts)}]", "dat", (None, lambda _: [parse_polish_date(t, today) for t in texts], len(texts))
+    yield f"parse_schedule_dates[{len(texts)}]", "dat", (None, lambda _: parse_schedule_dates(schedule, today), len(texts))
+    yield f"parse_schedule_dates[{len(texts)},cold]", "dat", (clear_date_cache, lambda _: parse_schedule_dates(schedule, today), len(texts))
+
+@bench
+def calendar_benches(ctx):
+    import calendar_sync
+    from calendar_sync import event_body, index_events, compute_calendar_diff, sync_calendar
+    from scraper import parse_http_schedule
+    for count in CALENDAR_SIZES[:1] if ctx["quick"] else CALENDAR_SIZES:
+        existing = calendar_events(count)
+        for i, ev in enumerate(existing): ev["id"] = f"ev{i}"
+        # Co dziesiąte wydarzenie ma inny kolor, co dwudzieste zniknęło z harmonogramu
+        desired = {}
+        for i, ev in enumerate(existing):
+            if i % 20 == 19: continue
+            body = event_body(ev["summary"][len(calendar_sync.EVENT_SUMMARY_PREFIX):], ev["start"]["date"])
+            if i % 10 == 0: body["colorId"] = "11"
+            desired[(body["start"]["date"], body["summary"])] = body
+        yield f"calendar_diff[e{count}]", "wydarzeń", (None, lambda _, e=existing, d=desired: compute_calendar_diff(d, index_events(e)), count)
+
+    schedule = parse_http_schedule(rebase_dates(load_recorded("schedule.json")))
+    types = [waste for _, waste in schedule]
+    latency = ctx["latency"]
+
+    def fresh_service():
+        calendar_sync._calendar_id_cache.clear()
+        return FakeCalendarService(calendar_events(200), latency=latency)
+
+    def with_mirror():
+        service = fresh_service()
+        _, mirror = sync_calendar(service, schedule, types, quiet)
+        return service, mirror
+
+    yield "calendar_sync[full_read]", "synchronizacji", (fresh_service, lambda service: sync_calendar(service, schedule, types, quiet), 1)
+    yield "calendar_sync[sync_token]", "synchronizacji", (with_mirror, lambda arg: sync_calendar(arg[0], schedule, types, quiet, mirror=arg[1]), 1)
+
+@bench
+def scrape_benches(ctx):
+    import scraper
+    import pipeline
+    import calendar_sync
+    from calendar_sync import sync_calendar
+    scraper.SCRAPER_BASE_URL = ctx["site"].url
+    target = os.path.join(ctx["tmp"], "harmonogram.pdf")
+    labeled = os.path.join(ctx["tmp"], "harmonogram_opisany.pdf")
+    yield "scrape_http", "pobrań", (None, lambda _: scraper.HttpScraper().fetch("Marszałkowska 1", target, quiet, no_step), 1)
+
+    def run_pipeline(service):
+        result = pipeline.scrape("Marszałkowska 1", target, log=quiet, backends=["http"])
+        pipeline.label(target, labeled, workers=1, use_cache=False, log=quiet)
+        schedule = pipeline.schedule_pairs(result["schedule"])
+        return sync_calendar(service, schedule, [waste for _, waste in schedule], quiet)
+
+    def fresh_service():
+        calendar_sync._calendar_id_cache.clear()
+        return FakeCalendarService(calendar_events(200), latency=ctx["latency"])
+
+    yield "pipeline[scrape+label+sync]", "przebiegów", (fresh_service, run_pipeline, 1)
+
+# --- POMIAR ---
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def measure(prepare, run, units, repeat, max_seconds):
+    """Rozgrzewka, potem do repeat pomiarów (min. 3, a po przekroczeniu max_seconds koniec),
+    na końcu jedno osobne wywołanie pod tracemalloc - żeby narzut śledzenia nie psuł czasów."""
+    prepare = prepare or (lambda: None)
+    run(prepare())
+    times, started = [], time.perf_counter()
+    while len(times) < repeat and (len(times) < 3 or time.perf_counter() - started < max_seconds):
+        arg = prepare()
+        t0 = time.perf_counter()
+        run(arg)
+        times.append(time.perf_counter() - t0)
+    arg = prepare()
+    tracemalloc.start()
+    try:
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    mean = sum(times) / len(times)
+    return {
+        "n": len(times),
+        "p50_ms": round(percentile(times, 50) * 1000, 3), "p90_ms": round(percentile(times, 90) * 1000, 3),
+        "p99_ms": round(percentile(times, 99) * 1000, 3), "mean_ms": round(mean * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3), "max_ms": round(max(times) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1), "throughput": round(units / mean, 2) if mean else None,
+    }
+
+def run_benchmarks(args):
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    pdfs = {}
+    def pdf(pages, icons):
+        if (pages, icons) not in pdfs: pdfs[(pages, icons)] = make_schedule_pdf(os.path.join(tmp, f"p{pages}_i{icons}.pdf"), pages, icons)
+        return pdfs[(pages, icons)]
+    site = SiteStandIn(pdf(4, 120), latency=args.latency_ms / 1000).start()
+    ctx = {"tmp": tmp, "quick": args.quick, "pdf": pdf, "site": site, "latency": args.latency_ms / 1000}
+    repeat = args.repeat or (5 if args.quick else DEFAULT_REPEAT)
+    stages = {}
+    try:
+        for factory in BENCHES:
+            for name, unit, (prepare, run, units) in factory(ctx):
+                if args.filter and not any(f in name for f in args.filter): continue
+                print(f"  {name} ...", file=sys.stderr, flush=True)
+                stages[name] = dict(measure(prepare, run, units, repeat, args.max_seconds), unit=f"{unit}/s")
+    finally:
+        site.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+    try: import numpy
+    except ImportError: numpy = None
+    meta = {"timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "numpy": numpy.__version__ if numpy else None,
+            "quick": args.quick, "latency_ms": args.latency_ms}
+    return {"meta": meta, "stages": stages}
+
+# --- RAPORT I PORÓWNANIE ---
+
+def print_table(report):
+    print(f"{'etap':<34} {'n':>3} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'pamięć KB':>10} {'przepustowość':>22}")
+    for name, s in report["stages"].items():
+        print(f"{name:<34} {s['n']:>3} {s['p50_ms']:>10.3f} {s['p90_ms']:>10.3f} {s['p99_ms']:>10.3f} {s['peak_kb']:>10.1f} {s['throughput']:>12} {s['unit']:<9}")
+
+def compare(report, baseline, threshold, metric, min_delta_ms):
+    """Zwraca listę regresji: etap wolniejszy o więcej niż threshold (ułamek) i min_delta_ms."""
+    regressions = []
+    print(f"\nPorównanie z bazą z {baseline['meta'].get('timestamp')} ({metric}, próg +{threshold:.0%}):")
+    if baseline["meta"].get("platform") != report["meta"]["platform"]:
+        print(f"  uwaga: baza z innej maszyny ({baseline['meta'].get('platform')})")
+    for name, s in report["stages"].items():
+        base = baseline["stages"].get(name)
+        if not base:
+            print(f"  {name:<34} brak w bazie")
+            continue
+        old, new = base[metric], s[metric]
+        ratio = new / old if old else float("inf")
+        slower = ratio > 1 + threshold and new - old > min_delta_ms
+        if slower: regressions.append(name)
+        print(f"  {name:<34} {old:>10.3f} -> {new:>10.3f} ms  {ratio - 1:>+8.1%}  {'REGRESJA' if slower else 'ok'}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarki etapów scrape -> opis PDF -> kalendarz.")
+    parser.add_argument("--quick", action="store_true", help="mniej wariantów i powtórzeń")
+    parser.add_argument("--repeat", type=int, help=f"liczba pomiarów na etap (domyślnie {DEFAULT_REPEAT}, z --quick 5)")
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS, help="limit czasu pomiarów jednego etapu (min. 3 pomiary)")
+    parser.add_argument("--filter", nargs="+", help="tylko etapy zawierające któryś z podanych napisów")
+    parser.add_argument("--latency-ms", type=float, default=0, help="sztuczne opóźnienie odpowiedzi portalu i Calendar API")
+    parser.add_argument("--save", help="zapisz wyniki (JSON) - np. jako bazę do --compare")
+    parser.add_argument("--compare", help="plik JSON z wcześniejszymi wynikami (baza)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="dopuszczalne spowolnienie względem bazy (0.2 = 20%%)")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p90_ms", "p99_ms", "mean_ms", "min_ms"])
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="różnice mniejsze niż tyle ms nie są regresją (szum)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+    print_table(report)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f: baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.metric, args.min_delta_ms)
+        if regressions:
+            print(f"\nRegresje: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""Dane i atrapy do benchmarków: syntetyczne PDF harmonogramu, atrapa Google Calendar API
+i lokalny serwer odtwarzający nagrane odpowiedzi portalu warszawa19115.pl."""
+import os
+import json
+import time
+import random
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded")
+
+# Kolory ikon jak w legendzie PDF miasta + kilka, które nie pasują do żadnej frakcji
+ICON_COLORS = [(83, 88, 90), (33, 35, 35), (0, 95, 170), (45, 160, 45), (255, 205, 0), (245, 170, 0),
+               (140, 90, 60), (230, 90, 20), (200, 200, 200), (250, 250, 250), (10, 100, 160)]
+
+# --- SYNTETYCZNE PDF ---
+
+def make_schedule_pdf(path, pages, icons_per_page, seed=1):
+    """PDF w układzie harmonogramu miasta: siatka dni miesiąca (7 x 6) na stronę A4 poziomo
+    i ikony frakcji w komórkach. Ta sama para (pages, icons_per_page, seed) daje ten sam plik."""
+    import fitz
+    rnd = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=842, height=595)
+        for row in range(6):
+            for col in range(7):
+                page.draw_rect(fitz.Rect(40 + col * 110, 40 + row * 80, 140 + col * 110, 110 + row * 80), color=(0, 0, 0))
+        for _ in range(icons_per_page):
+            color, size = rnd.choice(ICON_COLORS), rnd.choice([12, 16, 20, 30])
+            pm = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size, size), False)
+            pm.set_rect(pm.irect, color)
+            if rnd.random() < 0.5: pm.set_rect(fitz.IRect(0, 0, size // 2, size), (255, 255, 255))
+            x = 40 + rnd.randrange(7) * 110 + rnd.choice([10, 40, 70])
+            y = 45 + rnd.randrange(6) * 80 + rnd.choice([5, 30])
+            page.insert_image(fitz.Rect(x, y, x + size, y + size), pixmap=pm)
+    doc.save(path, no_new_id=True)
+    doc.close()
+    return path
+
+def dense_icons(count, rows=30, seed=1, labels=("PAPIER", "SZKŁO", "ZMIESZANE", "PLASTIK", "ZIELONE", "SKIP")):
+    """[(fitz.Rect, etykieta)] - gęsta strona bez PDF: count ikon w rows wierszach A4 pionowo, z losowym
+    rozmiarem i przesunięciem w pionie (ikony sąsiednich wierszy częściowo na siebie zachodzą)."""
+    import fitz
+    rnd = random.Random(seed)
+    icons = []
+    for _ in range(count):
+        size = rnd.uniform(8, 30)
+        x, y = rnd.uniform(0, 595 - size), 20 + rnd.randrange(rows) * 26 + rnd.uniform(-4, 4)
+        icons.append((fitz.Rect(x, y, x + size, y + rnd.uniform(0.6, 1.0) * size), rnd.choice(labels)))
+    return icons
+
+# --- NAGRANE ODPOWIEDZI PORTALU ---
+
+def load_recorded(name):
+    with open(os.path.join(RECORDED_DIR, name), "r", encoding="utf-8") as f: return json.load(f)
+
+def rebase_dates(node, today=None):
+    """Przenosi daty nagranego harmonogramu na najbliższe 12 miesięcy (dzień i miesiąc bez zmian),
+    żeby parse_http_schedule nie odrzucał ich jako przeszłych niezależnie od dnia uruchomienia."""
+    today = today or datetime.date.today()
+    if isinstance(node, list): return [rebase_dates(item, today) for item in node]
+    if not isinstance(node, dict): return node
+    out = {}
+    for key, value in node.items():
+        if key == "data" and isinstance(value, str):
+            d = datetime.date.fromisoformat(value[:10])
+            if (d.month, d.day) == (2, 29): d = d.replace(day=28)
+            year = today.year if (d.month, d.day) >= (today.month, today.day) else today.year + 1
+            out[key] = d.replace(year=year).isoformat()
+        else: out[key] = rebase_dates(value, today)
+    return out
+
+class SiteStandIn:
+    """Lokalny serwer HTTP zamiast warszawa19115.pl: strona portletu, autocomplete, harmonogram
+    i PDF z nagranych plików. latency - sztuczne opóźnienie każdej odpowiedzi (s),
+    failures - ile kolejnych żądań dostanie 503 (np. do sprawdzenia ponowień)."""
+
+    def __init__(self, pdf_path, latency=0.0, port=0):
+        self.pdf_bytes = open(pdf_path, "rb").read()
+        self.autocomplete = json.dumps(load_recorded("autocomplete.json")).encode("utf-8")
+        self.schedule = json.dumps(rebase_dates(load_recorded("schedule.json"))).encode("utf-8")
+        self.latency = latency
+        self.requests = 0
+        self.failures = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args): pass
+
+            def _send(self, body, ctype):
+                stand_in.requests += 1
+                if stand_in.latency: time.sleep(stand_in.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Set-Cookie", "JSESSIONID=benchmark; Path=/")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _fail(self):
+                if not stand_in.failures: return False
+                stand_in.failures -= 1
+                stand_in.requests += 1
+                self.send_error(503)
+                return True
+
+            def _resource(self):
+                return parse_qs(urlparse(self.path).query).get("p_p_resource_id", [""])[0]
+
+            def do_GET(self):
+                if self._fail(): return
+                if self._resource() == "pdfResourceURL": self._send(stand_in.pdf_bytes, "application/pdf")
+                else: self._send(b"<html><body>harmonogramy</body></html>", "text/html; charset=utf-8")
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self._fail(): return
+                resource = self._resource()
+                if resource == "autocompleteResourceURL": self._send(stand_in.autocomplete, "application/json")
+                elif resource == "ajaxResourceURL": self._send(stand_in.schedule, "application/json")
+                else: self.send_error(404)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/harmonogramy-wywozu-odpadow"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+# --- ATRAPA GOOGLE CALENDAR API ---
+
+class _Request:
+    def __init__(self, service, fn):
+        self._service = service
+        self._fn = fn
+
+    def execute(self):
+        self._service._round_trip()
+        return self._fn()
+
+class _Batch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None):
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        self._service._round_trip()  # cały batch to jedno żądanie HTTP
+        for request_id, request in self._requests:
+            if self._service.failures > 0:
+                self._service.failures -= 1
+                self._callback(request_id, None, Exception("503 Backend Error"))
+            else: self._callback(request_id, request._fn(), None)
+
+class _Resource:
+    def __init__(self, **methods): self.__dict__.update(methods)
+
+class FakeCalendarService:
+    """Obiekt w miejsce build('calendar', 'v3'): calendarList/calendars/events, stronicowanie,
+    syncToken i żądania batch. Liczy żądania HTTP (http_calls); latency - opóźnienie każdego (s);
+    failures - ile kolejnych operacji w batchu kończy się błędem; calendar_inserts - ile razy wywołano calendars.insert."""
+
+    def __init__(self, events=(), calendar_name="Wywóz Śmieci", page_size=250, latency=0.0):
+        self.calendar_id = "benchmark-calendar"
+        self.calendar_name = calendar_name
+        self.page_size = page_size
+        self.latency = latency
+        self.http_calls = 0
+        self.failures = 0
+        self.calendar_inserts = 0
+        self._events = {}
+        self._changes = []  # id zmienionych wydarzeń; syncToken = długość tej listy
+        self._next_id = 0
+        for ev in events: self._put(dict(ev))
+
+    def _round_trip(self):
+        self.http_calls += 1
+        if self.latency: time.sleep(self.latency)
+
+    def _put(self, ev):
+        if "id" not in ev:
+            self._next_id += 1
+            ev["id"] = f"ev{self._next_id}"
+        self._events[ev["id"]] = ev
+        self._changes.append(ev["id"])
+        return ev
+
+    def _page(self, ids, page_token, final):
+        start = int(page_token or 0)
+        items = [self._events.get(i) or {"id": i, "status": "cancelled"} for i in ids[start:start + self.page_size]]
+        resp = {"items": items}
+        if start + self.page_size < len(ids): resp["nextPageToken"] = str(start + self.page_size)
+        else: resp.update(final)
+        return resp
+
+    def calendarList(self):
+        def list_(pageToken=None):
+            return _Request(self, lambda: {"items": [{"id": "primary", "summary": "Prywatny"}, {"id": self.calendar_id, "summary": self.calendar_name}]})
+        return _Resource(list=list_)
+
+    def calendars(self):
+        def insert(body):
+            def run():
+                # Jeden kalendarz aplikacji: kolejne insert liczymy, ale trafiają w ten sam id
+                self.calendar_inserts += 1
+                self.calendar_name = body.get("summary", self.calendar_name)
+                return {"id": self.calendar_id, **body}
+            return _Request(self, run)
+        return _Resource(insert=insert)
+
+    def events(self):
+        def list_(calendarId, pageToken=None, syncToken=None, **params):
+            def run():
+                token = str(len(self._changes))
+                if syncToken is not None:
+                    ids = list(dict.fromkeys(self._changes[int(syncToken):]))
+                else:
+                    ids = sorted(self._events, key=lambda i: self._events[i].get("start", {}).get("date", ""))
+                return self._page(ids, pageToken, {"nextSyncToken": token})
+            return _Request(self, run)
+
+        def insert(calendarId, body):
+            return _Request(self, lambda: self._put(dict(body)))
+
+        def patch(calendarId, eventId, body):
+            return _Request(self, lambda: self._put({**self._events[eventId], **body}))
+
+        def delete(calendarId, eventId):
+            def run():
+                self._events.pop(eventId, None)
+                self._changes.append(eventId)
+            return _Request(self, run)
+
+        return _Resource(list=list_, insert=insert, patch=patch, delete=delete)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+def calendar_events(count, start=None, waste_types=("Papier", "Zmieszane", "Bio", "Szkło", "Metale i tworzywa sztuczne", "Zielone")):
+    """count przyszłych wydarzeń aplikacji (jak po wcześniejszej synchronizacji) - po jednym na dzień i rodzaj."""
+    from calendar_sync import event_body
+    start = start or datetime.date.today() + datetime.timedelta(days=1)
+    return [event_body(waste_types[i % len(waste_types)], (start + datetime.timedelta(days=i // len(waste_types))).isoformat()) for i in range(count)]
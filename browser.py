@@ -0,0 +1,279 @@
+"""Backend Selenium: pula rozgrzanych przeglądarek Chromium i przebieg po stronie 19115.
+Ładowany dopiero, gdy Selenium jest potrzebny."""
+import os
+import glob
+import time
+import queue
+import shutil
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
+try:
+    import psutil
+except ImportError:
+    psutil = None  # Bez psutil pula nie sprawdza pamięci przeglądarek
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+#from webdriver_manager.chrome import ChromeDriverManager
+
+from config import (TARGET_URL, TARGET_ORIGIN, DOWNLOAD_DIR, SCHEDULE_ELEMENT_IDS, DOWNLOAD_TIMEOUT,
+                    BROWSER_POOL_SIZE, BROWSER_MAX_USES, BROWSER_MAX_RSS_MB, BROWSER_ACQUIRE_TIMEOUT)
+from progress import update_progress
+from scraper import ScraperBackend
+
+# --- PULA PRZEGLĄDAREK ---
+
+def create_chrome_driver(download_dir):
+    os.makedirs(download_dir, exist_ok=True)
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--log-level=3")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+
+    prefs = {"download.default_directory": download_dir, "download.prompt_for_download": False, "plugins.always_open_pdf_externally": True}
+    chrome_options.add_experimental_option("prefs", prefs)
+
+    # --- ZMIANA: WARUNKOWE UŻYCIE STEROWNIKA ---
+    # Na Dockerze (Linux) używamy systemowego. Na Windowsie - Webdriver Manager.
+    if os.path.exists("/usr/bin/chromium") and os.path.exists("/usr/bin/chromedriver"):
+        chrome_options.binary_location = "/usr/bin/chromium"
+        service = Service("/usr/bin/chromedriver")
+        print("Używam systemowego Chromium (Docker/Linux).")
+    else:
+        # Importujemy tylko tutaj, żeby Docker nie wywalił błędu przy starcie
+        from webdriver_manager.chrome import ChromeDriverManager
+        service = Service(ChromeDriverManager().install())
+        print("Używam Webdriver Manager (Windows/Local).")
+
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+class BrowserSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.download_dir = None
+
+class BrowserPool:
+    """Trzyma rozgrzane sesje Chromium. Każde zadanie dostaje czystą sesję
+    (wyczyszczone cookies i storage, własny katalog pobierania); sesja wraca
+    do puli albo jest zamykana po BROWSER_MAX_USES użyciach, przy zbyt dużym
+    zużyciu pamięci lub gdy nie odpowiada."""
+
+    def __init__(self, size, max_uses, max_rss_mb):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)  # zwrot sesji do puli albo zwolnione miejsce
+        self._closed = False
+
+    def _new_session(self):
+        return BrowserSession(create_chrome_driver(DOWNLOAD_DIR))
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._closed or self._created >= self.size: return False
+            self._created += 1
+            return True
+
+    def _free_slot(self):
+        with self._lock:
+            self._created -= 1
+            self._available.notify()
+
+    def _discard(self, sess):
+        self._free_slot()
+        try: sess.driver.quit()
+        except: pass
+
+    def _healthy(self, sess):
+        try:
+            sess.driver.execute_script("return 1")
+            return True
+        except: return False
+
+    def _rss_mb(self, sess):
+        if psutil is None: return 0
+        try:
+            proc = psutil.Process(sess.driver.service.process.pid)
+            return sum(p.memory_info().rss for p in [proc] + proc.children(recursive=True)) / (1024 * 1024)
+        except: return 0
+
+    def _prepare(self, sess):
+        driver = sess.driver
+        driver.get("about:blank")
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": TARGET_ORIGIN, "storageTypes": "all"})
+        sess.download_dir = tempfile.mkdtemp(prefix="job_", dir=DOWNLOAD_DIR)
+        driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": sess.download_dir})
+        sess.uses += 1
+        return sess
+
+    def warm(self):
+        while self._reserve_slot():
+            try: self._idle.put(self._new_session())
+            except Exception as e:
+                self._free_slot()
+                print(f"Błąd rozgrzewania przeglądarki: {e}")
+                return
+
+    def acquire(self, timeout=BROWSER_ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._closed: raise Exception("Pula przeglądarek jest zamknięta")
+            try: sess = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve_slot():
+                    try: sess = self._new_session()
+                    except:
+                        self._free_slot()
+                        raise
+                else:
+                    # Pula pełna: czekamy, aż release() odda sesję albo zamknie ją i zwolni miejsce na nową
+                    with self._lock:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0: raise Exception("Brak wolnej przeglądarki w puli")
+                        if self._idle.empty() and self._created >= self.size and not self._closed: self._available.wait(remaining)
+                    continue
+            if not self._healthy(sess):
+                self._discard(sess); continue
+            try: return self._prepare(sess)
+            except: self._discard(sess)
+
+    def release(self, sess):
+        if sess.download_dir: shutil.rmtree(sess.download_dir, ignore_errors=True)
+        sess.download_dir = None
+        recycle = self._closed or sess.uses >= self.max_uses or not self._healthy(sess)
+        if not recycle and self.max_rss_mb and self._rss_mb(sess) > self.max_rss_mb: recycle = True
+        if recycle: self._discard(sess)
+        else:
+            try: sess.driver.get("about:blank")
+            except: self._discard(sess); return
+            self._idle.put(sess)
+            with self._lock: self._available.notify()
+
+    @contextmanager
+    def session(self):
+        sess = self.acquire()
+        try: yield sess
+        finally: self.release(sess)
+
+    def close(self):
+        self._closed = True
+        with self._lock: self._available.notify_all()
+        while True:
+            try: self._discard(self._idle.get_nowait())
+            except queue.Empty: break
+
+# --- WARUNKI OCZEKIWANIA (zamiast stałych time.sleep) ---
+
+def address_suggestion_ready(driver):
+    """Lista podpowiedzi adresu jest wypełniona - zwraca pierwszą widoczną pozycję."""
+    for el in driver.find_elements(By.CSS_SELECTOR, "li.yui3-aclist-item"):
+        try:
+            if el.is_displayed() and el.text.strip(): return el
+        except: pass
+    return False
+
+def schedule_rendered(driver):
+    """Po kliknięciu buttonNext przynajmniej jedna data harmonogramu ma już tekst."""
+    for html_id in SCHEDULE_ELEMENT_IDS:
+        for el in driver.find_elements(By.ID, html_id):
+            try:
+                if el.text.strip(): return True
+            except: pass
+    return False
+
+def finished_download(download_dir):
+    """Chrome pisze do *.crdownload i po zakończeniu zmienia nazwę na docelową,
+    więc gotowy PDF to *.pdf przy braku plików tymczasowych."""
+    if glob.glob(os.path.join(download_dir, "*.crdownload")): return False
+    files = glob.glob(os.path.join(download_dir, "*.pdf"))
+    return files[0] if files else False
+
+browser_pool = BrowserPool(BROWSER_POOL_SIZE, BROWSER_MAX_USES, BROWSER_MAX_RSS_MB)
+atexit.register(browser_pool.close)
+
+# --- SCRAPER SELENIUM (zapas dla HTTP) ---
+
+class SeleniumScraper(ScraperBackend):
+    """Dotychczasowy przebieg w Chromium z puli - zapas, gdy API portalu się zmieni."""
+    name = "selenium"
+
+    def fetch(self, address, pdf_target, log, step):
+        update_progress(5, "Start przeglądarki...")
+        with step("browser_start"): browser = browser_pool.acquire()
+        driver = browser.driver
+        log(f"Sesja przeglądarki z puli (użycie {browser.uses}/{browser_pool.max_uses}).")
+
+        schedule_data = []
+        pdf_ok = False
+        try:
+            update_progress(10, "Pobieranie strony...")
+            log(f"Strona: {TARGET_URL}")
+            with step("page_load"): driver.get(TARGET_URL)
+            wait = WebDriverWait(driver, 20, poll_frequency=0.1)
+            log("Strona załadowana.")
+
+            update_progress(15, "Akceptacja cookies...")
+            try:
+                consent = WebDriverWait(driver, 3).until(EC.element_to_be_clickable((By.XPATH, "//button[contains(.,'Zgoda na wszystkie')]")))
+                consent.click()
+                log("Zaakceptowano pliki cookie.")
+            except: 
+                log("Brak banera cookies.")
+
+            update_progress(20, "Szukanie adresu...")
+            with step("address_select"):
+                input_el = wait.until(EC.element_to_be_clickable((By.ID, "addressAutoComplete")))
+                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", input_el)
+                input_el.clear()
+                input_el.send_keys(address)
+
+                try:
+                    suggestion = wait.until(address_suggestion_ready)
+                    txt_sug = suggestion.text
+                    suggestion.click()
+                    log(f"Wybrano: {txt_sug}")
+                except: raise Exception("Brak podpowiedzi adresu!")
+
+            update_progress(30, "Pobieranie harmonogramu...")
+            with step("schedule_render"):
+                wait.until(EC.element_to_be_clickable((By.ID, "buttonNext"))).click()
+                try: wait.until(schedule_rendered)
+                except: log("Harmonogram nie pojawił się na stronie w czasie.")
+
+            # PDF (pdf_target=None - same daty, bez pobierania pliku)
+            if pdf_target:
+                update_progress(40, "Pobieranie PDF...")
+                try:
+                    downloaded_file = None
+                    with step("pdf_download"):
+                        wait.until(EC.element_to_be_clickable((By.ID, "downloadPdfLink"))).click()
+                        try: downloaded_file = WebDriverWait(driver, DOWNLOAD_TIMEOUT, poll_frequency=0.1).until(lambda d: finished_download(browser.download_dir))
+                        except: log("Nie doczekano się pobrania PDF.")
+                    if downloaded_file:
+                        os.replace(downloaded_file, pdf_target)
+                        pdf_ok = True
+                except Exception as e: log(f"Błąd PDF: {e}")
+
+            # HTML
+            for html_id, waste_name in SCHEDULE_ELEMENT_IDS.items():
+                try:
+                    txt = driver.find_element(By.ID, html_id).text.strip()
+                    if txt: schedule_data.append((txt, waste_name))
+                except: pass
+        finally:
+            browser_pool.release(browser)
+        return schedule_data, pdf_ok
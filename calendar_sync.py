@@ -0,0 +1,253 @@
+"""Klient Calendar API i synchronizacja harmonogramu z Kalendarzem (różnice, batch, syncToken)."""
+import json
+import datetime
+import threading
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.errors import HttpError
+
+from config import CALENDAR_NAME, EVENT_SUMMARY_PREFIX, CALENDAR_BATCH_SIZE, WASTE_COLORS, GOOGLE_HTTP_TIMEOUT
+from dates import parse_polish_dates
+from progress import update_progress
+from state import bump_sync_counter, address_id
+from metrics import span, GOOGLE_API_REQUESTS, GOOGLE_API_ERRORS, CALENDAR_READS
+from google_auth import credential_manager
+
+# --- KLIENT CALENDAR API ---
+
+_discovery_doc = None
+_discovery_lock = threading.Lock()
+_services = threading.local()  # httplib2.Http nie jest bezpieczny wątkowo - osobny klient na wątek
+
+def calendar_discovery_doc():
+    """Dokument discovery Calendar v3 parsowany raz na proces (wersja dołączona do biblioteki)."""
+    global _discovery_doc
+    with _discovery_lock:
+        if _discovery_doc is None:
+            try:
+                from googleapiclient.discovery_cache import get_static_doc
+                doc = get_static_doc('calendar', 'v3')
+                _discovery_doc = json.loads(doc) if doc else False
+            except Exception:
+                _discovery_doc = False
+        return _discovery_doc
+
+def get_google_service(user=None):
+    """Klient Calendar API wielokrotnego użytku: jeden na wątek i użytkownika, z trwałym połączeniem
+    HTTP (httplib2 trzyma otwarte połączenie do googleapis.com). Budowany od nowa dopiero,
+    gdy zmieni się obiekt poświadczeń (nowe logowanie)."""
+    manager = credential_manager(user)
+    creds = manager.get()
+    if not creds: return None
+    cache = getattr(_services, "by_path", None)
+    if cache is None: cache = _services.by_path = {}
+    cached = cache.get(manager.path)
+    if cached and cached[0] == manager.version: return cached[1]
+    http = AuthorizedHttp(creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+    doc = calendar_discovery_doc()
+    service = build_from_document(doc, http=http) if doc else build('calendar', 'v3', http=http)
+    cache[manager.path] = (manager.version, service)
+    return service
+
+# --- SYNCHRONIZACJA KALENDARZA ---
+
+_calendar_id_cache = {}
+_calendar_id_locks = {}  # użytkownik -> blokada wyszukiwania/zakładania kalendarza
+_calendar_id_locks_guard = threading.Lock()
+
+def _count_request(counter, method):
+    counter["requests"] += 1
+    GOOGLE_API_REQUESTS.inc(method=method)
+
+def event_body(waste_type, estr, owner=None):
+    """owner - id adresu (address_id) zapisywane w prywatnych właściwościach wydarzenia."""
+    body = {
+        'summary': f"{EVENT_SUMMARY_PREFIX}{waste_type}", 'start': {'date': estr}, 'end': {'date': estr},
+        'colorId': WASTE_COLORS.get(waste_type, "8"), 'transparency': 'transparent',
+        'reminders': {'useDefault': False, 'overrides': [
+            {'method': 'popup', 'minutes': 300},
+            {'method': 'email', 'minutes': 300}
+        ]}
+    }
+    if owner: body['extendedProperties'] = {'private': {'address_id': owner}}
+    return body
+
+def event_owner(ev):
+    """Id adresu, dla którego aplikacja założyła wydarzenie; None - wydarzenie nieoznaczone (starsza wersja lub ręczne)."""
+    return ((ev.get('extendedProperties') or {}).get('private') or {}).get('address_id')
+
+def _event_differs(ev, body):
+    def reminders(r):
+        r = r or {}
+        return (r.get('useDefault', False), sorted((o.get('method'), o.get('minutes')) for o in r.get('overrides', [])))
+    return (ev.get('colorId') != body['colorId'] or ev.get('transparency', 'opaque') != body['transparency']
+            or reminders(ev.get('reminders')) != reminders(body['reminders']))
+
+def resolve_calendar_id(service, counter, cached_calendar_id=None, user=None):
+    """Id kalendarza CALENDAR_NAME: z pamięci/stanu, a dopiero gdy brak - przez stronicowanie calendarList.
+    Wyszukiwanie i zakładanie idą pod blokadą użytkownika - równoległe zadania pierwszej synchronizacji
+    nie założą dwóch kalendarzy."""
+    cal_id = _calendar_id_cache.get((user, CALENDAR_NAME)) or cached_calendar_id
+    if cal_id: return cal_id, False
+    with _calendar_id_locks_guard: lock = _calendar_id_locks.setdefault(user, threading.Lock())
+    with lock:
+        cal_id = _calendar_id_cache.get((user, CALENDAR_NAME))
+        if cal_id: return cal_id, False
+        return _lookup_calendar_id(service, counter, user)
+
+def _lookup_calendar_id(service, counter, user):
+    cal_id, page_token = None, None
+    while True:
+        _count_request(counter, "calendarList.list")
+        clist = service.calendarList().list(pageToken=page_token).execute()
+        for e in clist.get('items', []):
+            if e.get('summary') == CALENDAR_NAME: cal_id = e['id']; break
+        if cal_id: break
+        page_token = clist.get('nextPageToken')
+        if not page_token: break
+    created = False
+    if not cal_id:
+        _count_request(counter, "calendars.insert")
+        cal_id = service.calendars().insert(body={'summary': CALENDAR_NAME, 'timeZone': 'Europe/Warsaw'}).execute()['id']
+        created = True
+    _calendar_id_cache[(user, CALENDAR_NAME)] = cal_id
+    return cal_id, created
+
+def _list_events(service, cal_id, counter, **params):
+    """Wszystkie strony events().list; zwraca (wydarzenia, nextSyncToken z ostatniej strony)."""
+    events, page_token = [], None
+    while True:
+        _count_request(counter, "events.list")
+        resp = service.events().list(calendarId=cal_id, singleEvents=True, maxResults=2500, pageToken=page_token, **params).execute()
+        events.extend(resp.get('items', []))
+        page_token = resp.get('nextPageToken')
+        if not page_token: return events, resp.get('nextSyncToken')
+
+def read_calendar_events(service, cal_id, counter, mirror=None):
+    """Przyszłe wydarzenia aplikacji w kalendarzu. Lokalna kopia (mirror) jest uzupełniana
+    przez syncToken - pobierane są tylko zmiany od ostatniego odczytu. Bez tokenu lub po
+    410 Gone (token wygasł) czytamy pełną listę. Zwraca (wydarzenia, nowy_mirror, czy_pełny_odczyt)."""
+    token = mirror.get("sync_token") if mirror and mirror.get("calendar_id") == cal_id else None
+    events = dict(mirror.get("events", {})) if token else {}
+    changed = None
+    if token:
+        try: changed, next_token = _list_events(service, cal_id, counter, syncToken=token)
+        except HttpError as e:
+            if e.resp.status != 410: raise
+    full = changed is None
+    if full:
+        events = {}
+        changed, next_token = _list_events(service, cal_id, counter)
+    for ev in changed:
+        if ev.get('status') == 'cancelled' or not ev.get('summary', '').startswith(EVENT_SUMMARY_PREFIX):
+            events.pop(ev['id'], None)
+        else:
+            events[ev['id']] = {k: ev[k] for k in ('id', 'summary', 'start', 'colorId', 'transparency', 'reminders', 'extendedProperties') if k in ev}
+    # Przeszłe terminy nie biorą udziału w porównaniu - nie trzymamy ich w kopii
+    today = datetime.date.today().isoformat()
+    events = {eid: ev for eid, ev in events.items() if ev.get('start', {}).get('date', today) >= today}
+    return list(events.values()), {"calendar_id": cal_id, "sync_token": next_token, "events": events}, full
+
+def index_events(events, owner=None):
+    """Indeks (data, tytuł) -> lista wydarzeń; pomija wydarzenia niezałożone przez aplikację.
+    Z owner - tylko wydarzenia tego adresu; owner=None - wszystkie wydarzenia aplikacji."""
+    index = {}
+    for ev in events:
+        summary = ev.get('summary', '')
+        if not summary.startswith(EVENT_SUMMARY_PREFIX): continue
+        if owner is not None and event_owner(ev) != owner: continue
+        index.setdefault((ev.get('start', {}).get('date'), summary), []).append(ev)
+    return index
+
+def compute_calendar_diff(desired, index, unowned=None):
+    """desired: {(data, tytuł): body}. Zwraca (inserts, updates, deletes).
+    Zarządzamy tylko typami obecnymi w desired: ich przyszłe wydarzenia z inną datą
+    (przesunięty termin) oraz duplikaty są usuwane, różniące się kolorem/przypomnieniami - poprawiane.
+    unowned - indeks nieoznaczonych wydarzeń: pasujące do desired są przejmowane (patch dopisuje
+    właściciela) zamiast dublowane, pozostałe nigdy nie są usuwane."""
+    inserts, updates, deletes = [], [], []
+    managed = {summary for _, summary in desired}
+    unowned = unowned or {}
+    for key, body in desired.items():
+        found = index.get(key, [])
+        if not found:
+            if unowned.get(key): updates.append((unowned[key][0]['id'], body))
+            else: inserts.append(body)
+            continue
+        if _event_differs(found[0], body): updates.append((found[0]['id'], body))
+        deletes.extend(ev['id'] for ev in found[1:])
+    for key, evs in index.items():
+        if key[1] in managed and key not in desired: deletes.extend(ev['id'] for ev in evs)
+    return inserts, updates, deletes
+
+def execute_calendar_batches(service, cal_id, inserts, updates, deletes, counter, log):
+    """Wysyła zmiany w żądaniach batch Google API (po CALENDAR_BATCH_SIZE operacji).
+    Zwraca liczbę udanych operacji każdego rodzaju i nieudanych (errors)."""
+    ops = [("insert", service.events().insert(calendarId=cal_id, body=body)) for body in inserts]
+    ops += [("update", service.events().patch(calendarId=cal_id, eventId=eid, body=body)) for eid, body in updates]
+    ops += [("delete", service.events().delete(calendarId=cal_id, eventId=eid)) for eid in deletes]
+    done = {"insert": 0, "update": 0, "delete": 0, "errors": 0}
+    def callback(request_id, response, exception):
+        kind = request_id.split(":")[0]
+        if exception is not None:
+            done["errors"] += 1
+            GOOGLE_API_ERRORS.inc(method=f"events.{kind}")
+            log(f" -> Błąd kalendarza ({kind}): {exception}")
+        else: done[kind] += 1
+    for start in range(0, len(ops), CALENDAR_BATCH_SIZE):
+        chunk = ops[start:start + CALENDAR_BATCH_SIZE]
+        batch = service.new_batch_http_request(callback=callback)
+        for i, (kind, req) in enumerate(chunk): batch.add(req, request_id=f"{kind}:{start + i}")
+        _count_request(counter, "batch")
+        update_progress(80 + int(((start + len(chunk)) / len(ops)) * 15), "Wysyłanie zmian do Kalendarza...")
+        batch.execute()
+    return done
+
+def sync_calendar(service, schedule_data, allowed_types, log, cached_calendar_id=None, mirror=None, user=None, address=None):
+    """Porównuje harmonogram z kalendarzem i wysyła tylko różnice, zbiorczo. Nieudane operacje batch
+    są liczone w statystyce errors - wywołujący decyduje, czy przebieg jest udany.
+    Z address zmieniane są wyłącznie wydarzenia oznaczone id tego adresu - kalendarz może
+    dzielić kilka adresów i wpisy dodane ręcznie. Zwraca (statystyki, mirror do zapisania w stanie)."""
+    counter = {"requests": 0}
+    with span("calendar_resolve"): cal_id, created = resolve_calendar_id(service, counter, cached_calendar_id, user)
+    if created: log("Utworzono nowy kalendarz.")
+    with span("calendar_list"):
+        try: existing, mirror, full_read = read_calendar_events(service, cal_id, counter, mirror)
+        except HttpError as e:
+            # Zapamiętany kalendarz mógł zostać usunięty - szukamy go od nowa
+            if e.resp.status != 404: raise
+            _calendar_id_cache.pop((user, CALENDAR_NAME), None)
+            cal_id, created = resolve_calendar_id(service, counter, user=user)
+            if created: log("Utworzono nowy kalendarz.")
+            existing, mirror, full_read = read_calendar_events(service, cal_id, counter)
+    bump_sync_counter("calendar_full_reads" if full_read else "calendar_incremental_reads")
+    CALENDAR_READS.inc(mode="full" if full_read else "incremental")
+    log(f"Odczyt kalendarza: {'pełny' if full_read else 'przyrostowy (syncToken)'}, wydarzeń: {len(existing)}")
+    owner = address_id(address) if address else None
+    index = index_events(existing, owner)
+    unowned = {key: [ev for ev in evs if event_owner(ev) is None] for key, evs in index_events(existing).items()} if owner else None
+
+    desired = {}
+    today = datetime.date.today()
+    for date_text, waste_type in schedule_data:
+        if waste_type not in allowed_types:
+            log(f" -> Pominięto (filtr): {waste_type}")
+            continue
+        # Element strony może zawierać kilka dat - każda to osobne wydarzenie
+        for edate in parse_polish_dates(date_text, today):
+            body = event_body(waste_type, edate.isoformat(), owner)
+            desired[(body['start']['date'], body['summary'])] = body
+
+    inserts, updates, deletes = compute_calendar_diff(desired, index, unowned)
+    for key in desired:
+        if key in index: log(f" -> Duplikat: {key[1][len(EVENT_SUMMARY_PREFIX):]}")
+    for body in inserts: log(f" -> DODANO: {body['summary'][len(EVENT_SUMMARY_PREFIX):]} ({body['start']['date']})")
+    done = {"insert": 0, "update": 0, "delete": 0, "errors": 0}
+    if inserts or updates or deletes:
+        with span("calendar_write"): done = execute_calendar_batches(service, cal_id, inserts, updates, deletes, counter, log)
+    log(f"Kalendarz: +{done['insert']} ~{done['update']} -{done['delete']}" + (f", błędów: {done['errors']}" if done['errors'] else "")
+        + f", zapytań do API: {counter['requests']}")
+    return {"calendar_id": cal_id, "inserted": done["insert"], "updated": done["update"], "deleted": done["delete"], "errors": done["errors"],
+            "unchanged": len(desired) - len(inserts) - len(updates), "requests": counter["requests"], "full_read": full_read}, mirror
@@ -0,0 +1,77 @@
+"""Wiersz poleceń do pracy bez panelu WWW (cron, skrypty wsadowe).
+
+    python cli.py label harmonogram.pdf harmonogram_opisany.pdf [--workers 4] [--no-cache]
+    python cli.py scrape "Marszałkowska 1" [-o harmonogram.json] [--pdf harmonogram.pdf] [--backends http]
+    python cli.py sync harmonogram.json [--types Papier Szkło] [--user kowalscy] [--address "Marszałkowska 1"]
+
+Każde polecenie ładuje tylko to, czego potrzebuje: label nie importuje Selenium ani klientów Google,
+a sync korzysta z tokenu zapisanego po zalogowaniu w panelu.
+"""
+import sys
+import json
+import argparse
+
+import pipeline
+
+def log(msg):
+    # Logi na stderr - stdout zostaje na wynik (JSON)
+    print(msg, file=sys.stderr)
+
+def cmd_label(args):
+    ok = pipeline.label(args.input, args.output, workers=args.workers, use_cache=not args.no_cache, log=log)
+    if not ok: log(f"Nie udało się opisać {args.input}")
+    return 0 if ok else 1
+
+def cmd_scrape(args):
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()] if args.backends else None
+    result = pipeline.scrape(args.address, pdf_target=args.pdf, log=log, backends=backends)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write(text + "\n")
+    else: print(text)
+    return 0
+
+def cmd_sync(args):
+    with open(args.schedule, "r", encoding="utf-8") as f: data = json.load(f)
+    # Plik z `cli.py scrape` albo sama lista wpisów {"dateText", "wasteType"}
+    schedule = data.get("schedule", []) if isinstance(data, dict) else data
+    address = args.address or (data.get("address") if isinstance(data, dict) else None)
+    stats = pipeline.sync(schedule, allowed_types=args.types, log=log, user=args.user, address=address)
+    print(json.dumps(stats, ensure_ascii=False))
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Harmonogram wywozu odpadów 19115 - scrape, opis PDF i synchronizacja z Kalendarzem Google.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("label", help="opisz ikony w lokalnym pliku PDF")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--workers", type=int, default=None, help="liczba procesów (domyślnie PDF_WORKERS)")
+    p.add_argument("--no-cache", action="store_true", help="nie korzystaj z cache opisanych PDF")
+    p.set_defaults(func=cmd_label)
+
+    p = sub.add_parser("scrape", help="pobierz harmonogram adresu do JSON")
+    p.add_argument("address")
+    p.add_argument("-o", "--output", help="plik wynikowy (domyślnie stdout)")
+    p.add_argument("--pdf", help="zapisz też PDF harmonogramu pod tą ścieżką")
+    p.add_argument("--backends", help="kolejność scraperów, np. http,selenium (domyślnie SCRAPER_BACKENDS)")
+    p.set_defaults(func=cmd_scrape)
+
+    p = sub.add_parser("sync", help="wyślij harmonogram z pliku JSON do Kalendarza Google")
+    p.add_argument("schedule")
+    p.add_argument("--types", nargs="+", help="rodzaje odpadów do synchronizacji (domyślnie wszystkie)")
+    p.add_argument("--user", help="gospodarstwo zalogowane przez /login?user=... (domyślnie TOKEN_FILE)")
+    p.add_argument("--address", help="adres - właściciel wydarzeń (domyślnie pole address z pliku scrape)")
+    p.set_defaults(func=cmd_sync)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try: return args.func(args)
+    except Exception as e:
+        log(f"BŁĄD: {e}")
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Konfiguracja aplikacji - same stałe, bez ciężkich importów (czytają ją też CLI i procesy potomne)."""
+import os
+
+# --- KONFIGURACJA ---
+TARGET_URL = "https://warszawa19115.pl/harmonogramy-wywozu-odpadow"
+TARGET_ORIGIN = "https://warszawa19115.pl"
+# Backend HTTP: portlet harmonogramów na stronie 19115 (adres bazowy można podmienić np. na lokalny serwer z nagranymi odpowiedziami)
+SCRAPER_BASE_URL = os.environ.get("SCRAPER_BASE_URL", TARGET_URL)
+SCHEDULE_PORTLET_ID = "portalCKMjunkschedules_WAR_portalCKMjunkschedulesportlet_INSTANCE_o5AIb2mimbRJ"
+# Kolejność prób: najpierw szybkie HTTP, Selenium jako zapas
+SCRAPER_BACKENDS = [b.strip() for b in os.environ.get("SCRAPER_BACKENDS", "http,selenium").split(",") if b.strip()]
+HTTP_TIMEOUT = 15
+HTTP_POOL_SIZE = 8
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+CALENDAR_NAME = "Wywóz Śmieci"
+EVENT_SUMMARY_PREFIX = "Odbiór: "  # po nim rozpoznajemy wydarzenia aplikacji w kalendarzu
+CREDENTIALS_FILE = "credentials.json"
+# Token Google (JSON, zapis atomowy); dawny token.pickle jest przenoszony jednorazowo.
+# Tokeny kolejnych gospodarstw (?user= przy logowaniu) leżą w TOKEN_DIR/<user>.json
+TOKEN_FILE = os.environ.get("TOKEN_FILE", "token.json")
+LEGACY_TOKEN_FILE = "token.pickle"
+TOKEN_DIR = os.environ.get("TOKEN_DIR", "tokens")
+TOKEN_REFRESH_MARGIN = 300  # odświeżamy token tyle sekund przed wygaśnięciem
+GOOGLE_HTTP_TIMEOUT = 30
+STATE_FILE = "last_state.json"  # dawny plik stanu - migrowany jednorazowo do STATE_DB
+STATE_DB = "state.db"
+LOG_RETENTION_RUNS = 200
+RUN_RETENTION = 2000
+# Liczba procesów do opisywania PDF (1 = szeregowo); równolegle dopiero od kilku stron
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "1"))
+PDF_PARALLEL_MIN_PAGES = 2
+# Cache opisanych PDF; LABELER_VERSION zmieniamy przy każdej zmianie wyglądu/logiki opisów
+LABELER_VERSION = 1
+PDF_CACHE_MAX_MB = int(os.environ.get("PDF_CACHE_MAX_MB", "200"))
+PDF_CACHE_MAX_AGE_DAYS = 90
+# Pula przeglądarek: liczba rozgrzanych sesji, recykling po N użyciach lub po przekroczeniu pamięci (MB)
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "1"))
+BROWSER_MAX_USES = int(os.environ.get("BROWSER_MAX_USES", "20"))
+BROWSER_MAX_RSS_MB = int(os.environ.get("BROWSER_MAX_RSS_MB", "800"))
+BROWSER_ACQUIRE_TIMEOUT = 120
+# Kolejka synchronizacji: liczba równoległych zadań, ile zadań pamiętać, okno pomiaru przepustowości (s)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_HISTORY = 200
+JOB_THROUGHPUT_WINDOW = 600
+# Strumień postępu (SSE): ile zdarzeń odtwarzać spóźnionym, ile kanałów trzymać, co ile s ping
+PROGRESS_REPLAY = 100
+PROGRESS_CHANNELS = 200
+PROGRESS_HEARTBEAT = 15
+CALENDAR_BATCH_SIZE = 50  # limit zalecany przez Calendar API dla jednego żądania batch
+# Automat: przebieg dzień po odbiorze o AUTO_RUN_HOUR + losowe (stałe dla adresu i dnia) przesunięcie do AUTO_JITTER_MINUTES;
+# przegapione w czasie przestoju terminy nadrabiamy po starcie, rozłożone w AUTO_CATCHUP_SPREAD sekund
+AUTO_RUN_HOUR = int(os.environ.get("AUTO_RUN_HOUR", "6"))
+AUTO_JITTER_MINUTES = int(os.environ.get("AUTO_JITTER_MINUTES", "120"))
+AUTO_CATCHUP_SPREAD = 300
+AUTO_RETRY_MINUTES = 60
+# Pamięć sparsowanych dat harmonogramu (LRU po parze tekst + data odniesienia)
+DATE_CACHE_SIZE = 4096
+# Data bez roku trafia w przeszłość najwyżej o tyle dni (spóźniony harmonogram), dalsza - to już następny rok
+DATE_PAST_DAYS = int(os.environ.get("DATE_PAST_DAYS", "45"))
+# Kanał ICS (subskrypcja bez OAuth): ile kanałów trzymać w pamięci, max-age odpowiedzi (s),
+# sugerowany klientom odstęp odświeżania
+ICS_MEMORY_ENTRIES = 1000
+ICS_MAX_AGE = 3600
+ICS_REFRESH_INTERVAL = "PT12H"
+# Profilowanie przebiegu na żądanie (/api/sync?profile=1): ile ostatnich profili trzymać
+PROFILE_KEEP = 20
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Katalogi tworzą moduły, które z nich korzystają (address_dir, PdfCache, pula przeglądarek)
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+PDF_CACHE_DIR = os.path.join(BASE_DIR, 'pdf_cache')
+DOWNLOAD_DIR = os.path.join(BASE_DIR, 'downloads')
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+ICS_DIR = os.path.join(BASE_DIR, 'ics_cache')
+
+# Id elementów strony z datami odbioru -> rodzaj odpadu
+SCHEDULE_ELEMENT_IDS = {"paper-date": "Papier", "mixed-date": "Zmieszane", "metals-date": "Metale i tworzywa sztuczne", "glass-date": "Szkło", "bio-date": "Bio", "green-date": "Zielone"}
+DOWNLOAD_TIMEOUT = 15
+
+WASTE_COLORS = {
+    "Papier": "7", 
+    "Metale i tworzywa sztuczne": "5", 
+    "Szkło": "10",
+    "Bio": "8", 
+    "Zmieszane": "8", 
+    "Zielone": "2"
+}
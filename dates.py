@@ -0,0 +1,94 @@
+"""Daty z harmonogramu 19115 zapisane po polsku.
+
+Jeden element strony może zawierać kilka dat ("5 i 19 stycznia"), zakres ("30 grudnia - 2 stycznia")
+albo datę liczbową ("15.01.2025", "2025-01-15"). Rok podany w tekście ma pierwszeństwo; bez niego
+bierzemy najbliższe wystąpienie daty od dnia odniesienia (today) cofniętego o DATE_PAST_DAYS - harmonogram
+pokazuje przyszłe odbiory, więc "12 lipca" w styczniu to lipiec tego roku, a "28 grudnia" w styczniu - zeszły grudzień.
+Wyniki są zapamiętywane (LRU) po parze (tekst, data odniesienia), więc przy przypiętej dacie
+odniesienia parser jest deterministyczny, a powtórne przebiegi tego samego harmonogramu nie parsują go od nowa.
+"""
+import re
+import datetime
+from functools import lru_cache
+
+from config import DATE_CACHE_SIZE, DATE_PAST_DAYS
+
+MONTH_MAP = {
+    'stycznia': 1, 'lutego': 2, 'marca': 3, 'kwietnia': 4, 'maja': 5, 'czerwca': 6,
+    'lipca': 7, 'sierpnia': 8, 'września': 9, 'października': 10, 'listopada': 11, 'grudnia': 12,
+    'styczeń': 1, 'luty': 2, 'marzec': 3, 'kwiecień': 4, 'maj': 5, 'czerwiec': 6,
+    'lipiec': 7, 'sierpień': 8, 'wrzesień': 9, 'październik': 10, 'listopad': 11, 'grudzień': 12
+}
+
+# Kolejność alternatyw ma znaczenie: najpierw pełne daty liczbowe, potem pojedyncze liczby i słowa
+_TOKEN_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?|(\d+)|(\w+)|([-–—])")
+_RANGE_WORDS = {"do"}
+
+def _upcoming_date(month, day, today):
+    """Pierwsze wystąpienie dnia/miesiąca nie wcześniej niż DATE_PAST_DAYS dni przed today
+    (28 grudnia w styczniu = zeszły rok, 12 lipca w styczniu = ten rok, 15 grudnia w czerwcu = ten rok)."""
+    earliest = today - datetime.timedelta(days=DATE_PAST_DAYS)
+    for year in range(earliest.year, earliest.year + 5):
+        try: d = datetime.date(year, month, day)
+        except ValueError: continue  # 29 lutego poza rokiem przestępnym
+        if d >= earliest: return d
+    return None
+
+def _assign_year(items, year):
+    # Rok stoi na końcu grupy ("15 grudnia i 12 stycznia 2025") - idąc wstecz, cofamy go o 1,
+    # gdy miesiąc wcześniejszej daty jest późniejszy niż następnej
+    later_month = None
+    for item in reversed(items):
+        if item[2] is not None: break
+        if item[1] is None: continue
+        if later_month is not None and item[1] > later_month: year -= 1
+        item[2], later_month = year, item[1]
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_cached(text, today):
+    items = []  # [dzień, miesiąc, rok, koniec_zakresu]
+    range_next = False
+    for m in _TOKEN_RE.finditer(text.lower()):
+        iso_y, iso_m, iso_d, dot_d, dot_m, dot_y, number, word, dash = m.groups()
+        if iso_y:
+            items.append([int(iso_d), int(iso_m), int(iso_y), range_next]); range_next = False
+        elif dot_d:
+            items.append([int(dot_d), int(dot_m), int(dot_y) if dot_y else None, range_next]); range_next = False
+        elif number:
+            if len(number) == 4: _assign_year(items, int(number))
+            else: items.append([int(number), None, None, range_next]); range_next = False
+        elif word:
+            month = MONTH_MAP.get(word)
+            if month:
+                for item in reversed(items):
+                    if item[1] is not None: break
+                    item[1] = month
+            elif word in _RANGE_WORDS: range_next = True
+        elif dash and items: range_next = True
+    dates = []
+    for day, month, year, range_end in items:
+        # Z zakresu bierzemy pierwszy dzień - to najwcześniejszy możliwy termin odbioru
+        if range_end or month is None: continue
+        try: d = datetime.date(year, month, day) if year else _upcoming_date(month, day, today)
+        except ValueError: d = None
+        if d and d not in dates: dates.append(d)
+    return tuple(dates)
+
+def parse_polish_dates(date_text, today=None):
+    """Wszystkie daty z jednego elementu harmonogramu (krotka, może być pusta)."""
+    if not isinstance(date_text, str): return ()
+    return _parse_cached(date_text.strip(), today or datetime.date.today())
+
+def parse_polish_date(date_text, today=None):
+    """Pierwsza data z tekstu albo None."""
+    dates = parse_polish_dates(date_text, today)
+    return dates[0] if dates else None
+
+def parse_schedule_dates(schedule, today=None):
+    """Cały harmonogram naraz: [(data, rodzaj)] dla każdej daty z par (tekst, rodzaj).
+    Data odniesienia liczona raz na wywołanie; teksty, z których nie wynika żadna data, są pomijane."""
+    today = today or datetime.date.today()
+    return [(d, waste_type) for date_text, waste_type in schedule for d in parse_polish_dates(date_text, today)]
+
+def clear_date_cache():
+    _parse_cached.cache_clear()
@@ -0,0 +1,125 @@
+"""Token Google w pamięci: jeden obiekt poświadczeń na użytkownika, odświeżany z wyprzedzeniem
+pod blokadą i zapisywany atomowo jako JSON (bez pickle). Bez klienta Calendar API - ten jest w calendar_sync."""
+import os
+import re
+import json
+import pickle
+import datetime
+import threading
+
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+
+from config import SCOPES, TOKEN_FILE, LEGACY_TOKEN_FILE, TOKEN_DIR, TOKEN_REFRESH_MARGIN
+
+USER_ID_RE = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+
+def token_path(user=None):
+    """Plik tokenu: TOKEN_FILE dla domyślnego gospodarstwa, TOKEN_DIR/<user>.json dla pozostałych."""
+    if not user: return TOKEN_FILE
+    if not USER_ID_RE.fullmatch(user) or user.startswith("."): raise ValueError(f"Nieprawidłowy identyfikator użytkownika: {user!r}")
+    return os.path.join(TOKEN_DIR, f"{user}.json")
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+class CredentialManager:
+    """Poświadczenia jednego użytkownika. get() zwraca ważny token bez czytania dysku przy każdym
+    wywołaniu - plik jest wczytywany ponownie tylko, gdy zmienił się jego czas modyfikacji
+    (np. po zalogowaniu w innym procesie). Token wygasający w ciągu TOKEN_REFRESH_MARGIN s
+    jest odświeżany przez jeden wątek; pozostałe czekają na blokadzie i dostają nowy."""
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.version = 0  # rośnie przy każdej podmianie obiektu (logowanie, odczyt z dysku) - klucz cache usług
+        self._creds = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _file_mtime(self):
+        try: return os.stat(self.path).st_mtime_ns
+        except OSError: return None
+
+    def _set(self, creds, mtime):
+        if creds is not self._creds: self.version += 1
+        self._creds, self._mtime = creds, mtime
+
+    def _load(self):
+        mtime = self._file_mtime()
+        if mtime is None:
+            if self.legacy_path and os.path.exists(self.legacy_path): self._migrate_legacy()
+            elif self._creds is not None: self._set(None, None)
+            return
+        if mtime == self._mtime: return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: info = json.load(f)
+            self._set(Credentials.from_authorized_user_info(info, SCOPES), mtime)
+        except Exception as e:
+            print(f"Błąd odczytu tokenu {self.path}: {e}")
+            self._set(None, mtime)
+
+    def _migrate_legacy(self):
+        """Jednorazowe przeniesienie token.pickle do JSON; pickle jest usuwany po udanym zapisie."""
+        try:
+            with open(self.legacy_path, "rb") as f: creds = pickle.load(f)
+            self._save(creds)
+            os.remove(self.legacy_path)
+            print(f"Token przeniesiony z {self.legacy_path} do {self.path}.")
+        except Exception as e:
+            print(f"Błąd migracji tokenu {self.legacy_path}: {e}")
+
+    def _save(self, creds):
+        _write_atomic(self.path, creds.to_json())
+        self._set(creds, self._file_mtime())
+
+    def _needs_refresh(self, creds):
+        if not creds.token or creds.expiry is None: return not creds.valid
+        # expiry w google-auth to naiwny czas UTC
+        return creds.expiry - datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) < datetime.timedelta(seconds=TOKEN_REFRESH_MARGIN)
+
+    def get(self):
+        with self._lock:
+            self._load()
+            creds = self._creds
+            if creds is None: return None
+            if not self._needs_refresh(creds): return creds
+            if not creds.refresh_token: return creds if creds.valid else None
+            try:
+                creds.refresh(Request())
+                self._save(creds)
+            except Exception as e:
+                print(f"Błąd odświeżania tokenu: {e}")
+                return creds if creds.valid else None
+            return creds
+
+    def store(self, creds):
+        """Zapis po zalogowaniu (OAuth callback)."""
+        with self._lock: self._save(creds)
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def credential_manager(user=None):
+    path = token_path(user)
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = _managers[path] = CredentialManager(path, LEGACY_TOKEN_FILE if not user else None)
+        return manager
+
+def get_google_creds(user=None):
+    return credential_manager(user).get()
@@ -0,0 +1,126 @@
+"""Kanał iCalendar (.ics) harmonogramu adresu - subskrypcja w dowolnym kalendarzu bez logowania Google.
+Kanał jest generowany tylko przy zmianie odcisku harmonogramu i trzymany w pamięci oraz na dysku,
+więc odpytywanie przez klientów kalendarza nie uruchamia scrapera ani ponownego renderowania."""
+import os
+import json
+import time
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+
+from config import (ICS_DIR, ICS_MEMORY_ENTRIES, ICS_REFRESH_INTERVAL, CALENDAR_NAME, EVENT_SUMMARY_PREFIX, WASTE_COLORS)
+from dates import parse_schedule_dates
+from state import state_store, address_id
+from metrics import ICS_REQUESTS
+
+# Kolory wydarzeń Google (colorId z WASTE_COLORS) jako nazwy CSS dla właściwości COLOR (RFC 7986)
+GOOGLE_COLOR_CSS = {"1": "lightsteelblue", "2": "darkseagreen", "3": "mediumorchid", "4": "lightcoral", "5": "gold", "6": "orange",
+                    "7": "darkturquoise", "8": "gray", "9": "royalblue", "10": "green", "11": "red"}
+
+# --- GENEROWANIE ICS ---
+
+def _escape(text):
+    return str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def _fold(line):
+    """Zawijanie linii do 75 bajtów (RFC 5545 3.1) bez dzielenia znaków UTF-8."""
+    out, current, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > 75:
+            out.append(current)
+            current, size = " ", 1
+        current += ch
+        size += n
+    out.append(current)
+    return "\r\n".join(out)
+
+def render_ics(address, schedule, allowed_types=None, reference_date=None, stamp=None):
+    """Treść kanału (bytes) z wpisów {"dateText", "wasteType"}; allowed_types=None - wszystkie rodzaje.
+    UID wydarzenia zależy tylko od adresu, daty i rodzaju, więc klient aktualizuje wydarzenia zamiast je dublować."""
+    stamp = (stamp or datetime.datetime.now(datetime.timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    pairs = [(item["dateText"], item["wasteType"]) for item in schedule if allowed_types is None or item["wasteType"] in allowed_types]
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//warsaw_waste_schedule_exporter//ICS//PL", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+             f"X-WR-CALNAME:{_escape(f'{CALENDAR_NAME} - {address}')}", "X-WR-TIMEZONE:Europe/Warsaw",
+             f"REFRESH-INTERVAL;VALUE=DURATION:{ICS_REFRESH_INTERVAL}", f"X-PUBLISHED-TTL:{ICS_REFRESH_INTERVAL}"]
+    for day, waste_type in sorted(set(parse_schedule_dates(pairs, reference_date))):
+        color = GOOGLE_COLOR_CSS.get(WASTE_COLORS.get(waste_type, "8"), "gray")
+        lines += ["BEGIN:VEVENT", f"UID:{address_id(address)}-{day:%Y%m%d}-{hashlib.sha1(waste_type.encode('utf-8')).hexdigest()[:8]}@warsaw-waste",
+                  f"DTSTAMP:{stamp}", f"DTSTART;VALUE=DATE:{day:%Y%m%d}", f"DTEND;VALUE=DATE:{day + datetime.timedelta(days=1):%Y%m%d}",
+                  f"SUMMARY:{_escape(EVENT_SUMMARY_PREFIX + waste_type)}", f"CATEGORIES:{_escape(waste_type)}", f"COLOR:{color}", "TRANSP:TRANSPARENT",
+                  # Przypomnienie jak w Kalendarzu Google: 300 min przed początkiem dnia odbioru
+                  "BEGIN:VALARM", "ACTION:DISPLAY", f"DESCRIPTION:{_escape(EVENT_SUMMARY_PREFIX + waste_type)}", "TRIGGER:-PT5H", "END:VALARM",
+                  "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode("utf-8")
+
+# --- CACHE KANAŁÓW ---
+
+class IcsFeedCache:
+    """Gotowe kanały adresów: pamięć (LRU, ICS_MEMORY_ENTRIES) -> dysk (<id>.ics + <id>.json) -> render.
+    Wpis jest ważny, dopóki odcisk harmonogramu w bazie stanu się nie zmieni; ETag to skrót treści,
+    Last-Modified - chwila wygenerowania."""
+
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # id adresu -> wpis
+        self._lock = threading.Lock()
+
+    def _paths(self, addr_id):
+        base = os.path.join(self.directory, addr_id)
+        return base + ".ics", base + ".json"
+
+    def _remember(self, addr_id, entry):
+        with self._lock:
+            self._memory[addr_id] = entry
+            self._memory.move_to_end(addr_id)
+            while len(self._memory) > self.max_entries: self._memory.popitem(last=False)
+
+    def _from_disk(self, addr_id, fingerprint):
+        body_path, meta_path = self._paths(addr_id)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f: meta = json.load(f)
+            if meta.get("fingerprint") != fingerprint: return None
+            with open(body_path, "rb") as f: body = f.read()
+        except (OSError, ValueError): return None
+        if hashlib.sha256(body).hexdigest()[:32] != meta.get("etag"): return None  # niedokończony zapis
+        return {**meta, "body": body}
+
+    def _store(self, addr_id, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        body_path, meta_path = self._paths(addr_id)
+        meta = {k: v for k, v in entry.items() if k != "body"}
+        for path, data in ((body_path, entry["body"]), (meta_path, json.dumps(meta).encode("utf-8"))):
+            tmp = f"{path}.{threading.get_ident()}.part"
+            with open(tmp, "wb") as f: f.write(data)
+            os.replace(tmp, path)
+
+    def get(self, addr_id):
+        """Wpis {"body", "etag", "last_modified" (epoch), "fingerprint"} albo None, gdy adres nie ma harmonogramu."""
+        row = state_store.schedule_by_id(addr_id)
+        if not row:
+            ICS_REQUESTS.inc(result="missing")
+            return None
+        fingerprint = row["fingerprint"] or row["updated_at"]
+        with self._lock:
+            entry = self._memory.get(addr_id)
+            if entry and entry["fingerprint"] == fingerprint:
+                self._memory.move_to_end(addr_id)
+                ICS_REQUESTS.inc(result="memory")
+                return entry
+        entry = self._from_disk(addr_id, fingerprint)
+        if entry: ICS_REQUESTS.inc(result="disk")
+        else:
+            ref = datetime.datetime.strptime(row["updated_at"], "%Y-%m-%d %H:%M:%S").date() if row["updated_at"] else None
+            allowed = json.loads(row["allowed_types"]) if row["allowed_types"] else None
+            body = render_ics(row["address"], json.loads(row["schedule"]), allowed, ref)
+            entry = {"body": body, "etag": hashlib.sha256(body).hexdigest()[:32], "last_modified": int(time.time()), "fingerprint": fingerprint}
+            try: self._store(addr_id, entry)
+            except OSError as e: print(f"Błąd zapisu kanału ICS {addr_id}: {e}")
+            ICS_REQUESTS.inc(result="render")
+        self._remember(addr_id, entry)
+        return entry
+
+ics_cache = IcsFeedCache(ICS_DIR, ICS_MEMORY_ENTRIES)
@@ -0,0 +1,175 @@
+"""Instrumentacja: liczniki i histogramy czasów etapów w formacie tekstowym Prometheus
+(bez dodatkowych zależności) oraz opcjonalne profilowanie pojedynczego przebiegu."""
+import os
+import io
+import glob
+import time
+import threading
+from contextlib import contextmanager
+
+from config import PROFILE_DIR, PROFILE_KEEP
+
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _label_text(names, values):
+    if not names: return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock: self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labels), 0)
+
+    def lines(self):
+        with self._lock: items = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labels, key)} {_num(v)}" for key, v in items]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, tuple(labels), tuple(buckets)
+        self._values = {}  # etykiety -> [liczniki kubełków..., suma, liczba]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            data = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def lines(self):
+        with self._lock: items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for key, data in items:
+            for bound, count in zip(self.buckets, data):
+                out.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + (_num(bound),))} {count}")
+            out.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + ('+Inf',))} {data[-1]}")
+            out.append(f"{self.name}_sum{_label_text(self.labels, key)} {round(data[-2], 6)}")
+            out.append(f"{self.name}_count{_label_text(self.labels, key)} {data[-1]}")
+        return out
+
+class Gauge:
+    """Wartość liczona w chwili odczytu /metrics: fn() zwraca liczbę albo {krotka_etykiet: liczba}."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn, labels=()):
+        self.name, self.help, self.fn, self.labels = name, help_text, fn, tuple(labels)
+
+    def lines(self):
+        try: values = self.fn()
+        except Exception: return []
+        if not isinstance(values, dict): values = {(): values}
+        return [f"{self.name}{_label_text(self.labels, key)} {_num(v)}" for key, v in sorted(values.items()) if v is not None]
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()): return self.add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=STAGE_BUCKETS): return self.add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, fn, labels=()): return self.add(Gauge(name, help_text, fn, labels))
+
+    def render(self):
+        out = []
+        for m in self._metrics:
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(m.lines())
+        return "\n".join(out) + "\n"
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("waste_stage_duration_seconds", "Czas etapów przebiegu synchronizacji.", ("stage",))
+STAGE_ERRORS = registry.counter("waste_stage_errors_total", "Etapy przerwane wyjątkiem.", ("stage",))
+SYNC_RUNS = registry.counter("waste_sync_runs_total", "Zakończone przebiegi synchronizacji.", ("status",))
+SCRAPER_ATTEMPTS = registry.counter("waste_scraper_attempts_total", "Próby pobrania harmonogramu przez backend.", ("backend", "result"))
+PDF_CACHE_REQUESTS = registry.counter("waste_pdf_cache_requests_total", "Odczyty cache opisanych PDF.", ("result",))
+GOOGLE_API_REQUESTS = registry.counter("waste_google_api_requests_total", "Żądania HTTP do Google Calendar API (batch = 1).", ("method",))
+GOOGLE_API_ERRORS = registry.counter("waste_google_api_errors_total", "Operacje Calendar API zakończone błędem.", ("method",))
+CALENDAR_READS = registry.counter("waste_calendar_reads_total", "Odczyty kalendarza: pełne i przyrostowe (syncToken).", ("mode",))
+ICS_REQUESTS = registry.counter("waste_ics_requests_total", "Odczyty kanałów ICS: z pamięci, z dysku, wygenerowane, 304, brak.", ("result",))
+
+@contextmanager
+def span(stage):
+    """Mierzy blok jako etap `stage` (histogram) i liczy przerwania wyjątkiem."""
+    t0 = time.perf_counter()
+    try: yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage)
+
+# --- PROFILOWANIE POJEDYNCZEGO PRZEBIEGU ---
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+def profile_paths(name):
+    """Pliki profilu przebiegu: raport tekstowy i surowy wynik (.prof dla cProfile, .html dla pyinstrument)."""
+    base = os.path.join(PROFILE_DIR, name)
+    return base + ".txt", next((p for p in (base + ".prof", base + ".html") if os.path.exists(p)), None)
+
+@contextmanager
+def profile_run(name, kind="cprofile"):
+    """Profiluje blok w bieżącym wątku (procesy puli opisywania PDF nie są widoczne).
+    pyinstrument jest opcjonalny - bez niego używany jest cProfile."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, name)
+    profiler = None
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+        except ImportError:
+            kind = "cprofile"
+    if profiler is None:
+        import cProfile
+        profiler = cProfile.Profile()
+    if kind == "cprofile": profiler.enable()
+    else: profiler.start()
+    try: yield
+    finally:
+        if kind == "cprofile":
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(base + ".prof")
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(60)
+            report = text.getvalue()
+        else:
+            profiler.stop()
+            with open(base + ".html", "w", encoding="utf-8") as f: f.write(profiler.output_html())
+            report = profiler.output_text(unicode=True, color=False)
+        with open(base + ".txt", "w", encoding="utf-8") as f: f.write(report)
+        _prune_profiles()
+
+def _prune_profiles():
+    reports = sorted(glob.glob(os.path.join(PROFILE_DIR, "*.txt")), key=os.path.getmtime, reverse=True)
+    for old in reports[PROFILE_KEEP:]:
+        for path in glob.glob(old[:-4] + ".*"):
+            try: os.remove(path)
+            except OSError: pass
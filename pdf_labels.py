@@ -0,0 +1,284 @@
+"""Opisywanie ikon w PDF harmonogramu (PyMuPDF) i cache opisanych plików.
+Nie importuje Selenium ani klientów Google - można go używać z crona/CLI."""
+import os
+import math
+import glob
+import time
+import shutil
+import hashlib
+import threading
+import multiprocessing
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Bez NumPy klasyfikacja ikon wraca do pętli po pikselach
+
+from config import PDF_WORKERS, PDF_PARALLEL_MIN_PAGES, LABELER_VERSION, PDF_CACHE_DIR, PDF_CACHE_MAX_MB, PDF_CACHE_MAX_AGE_DAYS
+from metrics import PDF_CACHE_REQUESTS
+
+# --- LOGIKA PDF I HELPERY ---
+
+PDF_LEGEND = [
+    {"name": "ZIELONE", "color": (83, 88, 90)}, {"name": "ZMIESZANE", "color": (33, 35, 35)},
+    {"name": "PAPIER", "color": (0, 95, 170)}, {"name": "SZKŁO", "color": (45, 160, 45)},
+    {"name": "PLASTIK", "color": (255, 205, 0)}, {"name": "PLASTIK", "color": (245, 170, 0)},
+    {"name": "PLASTIK", "color": (230, 150, 0)}, {"name": "SKIP", "color": (140, 90, 60)}, 
+    {"name": "SKIP", "color": (110, 70, 40)}, {"name": "SKIP", "color": (230, 90, 20)}, 
+]
+COLOR_MATCH_DISTANCE = 45
+PDF_LEGEND_MATRIX = np.array([item["color"] for item in PDF_LEGEND], dtype=np.int32) if np is not None else None
+
+def color_distance(c1, c2):
+    return math.sqrt(sum((a - b) ** 2 for a, b in zip(c1, c2)))
+
+def find_matching_fraction(pix, bbox, legend):
+    start_x = max(0, int(bbox.x0) + 2)
+    end_x = min(pix.width, int(bbox.x1) - 2)
+    start_y = max(0, int(bbox.y0) + 2)
+    end_y = min(pix.height, int(bbox.y1) - 2)
+    if start_x >= end_x or start_y >= end_y: return None
+    for x in range(start_x, end_x, 2):
+        for y in range(start_y, end_y, 2):
+            pixel_color = pix.pixel(x, y)
+            if sum(pixel_color) > 700: continue 
+            for item in legend:
+                if color_distance(pixel_color, item["color"]) < COLOR_MATCH_DISTANCE: return item["name"]
+    return None
+
+def classify_icons(pix, bboxes, legend=PDF_LEGEND):
+    """Wersja wsadowa find_matching_fraction: bufor pixmapy czytany raz na stronę,
+    odległości od legendy liczone jednym obliczeniem dla wszystkich ikon.
+    Zwraca etykiety w kolejności bboxes (te same co find_matching_fraction)."""
+    if np is None or pix.n < 3:
+        return [find_matching_fraction(pix, bbox, legend) for bbox in bboxes]
+    n = pix.n
+    buf = pix.samples_mv if hasattr(pix, "samples_mv") else pix.samples
+    img = np.frombuffer(buf, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width * n].reshape(pix.height, pix.width, n)
+
+    # Próbki każdej ikony w tej samej kolejności co pętla x -> y w find_matching_fraction
+    chunks, bounds, offset = [], [], 0
+    for bbox in bboxes:
+        start_x = max(0, int(bbox.x0) + 2)
+        end_x = min(pix.width, int(bbox.x1) - 2)
+        start_y = max(0, int(bbox.y0) + 2)
+        end_y = min(pix.height, int(bbox.y1) - 2)
+        if start_x >= end_x or start_y >= end_y:
+            bounds.append(None); continue
+        block = img[start_y:end_y:2, start_x:end_x:2].transpose(1, 0, 2).reshape(-1, n)
+        bounds.append((offset, offset + len(block)))
+        chunks.append(block)
+        offset += len(block)
+    if not chunks: return [None] * len(bboxes)
+
+    colors = PDF_LEGEND_MATRIX if legend is PDF_LEGEND else np.array([item["color"] for item in legend], dtype=np.int32)
+    px = np.concatenate(chunks).astype(np.int32)
+    diff = px[:, None, :3] - colors[None, :, :]
+    hits = ((diff * diff).sum(axis=2) < COLOR_MATCH_DISTANCE ** 2) & (px.sum(axis=1) <= 700)[:, None]
+    first_legend = hits.argmax(axis=1)
+    hit_idx = np.flatnonzero(hits.any(axis=1))
+
+    labels = []
+    for b in bounds:
+        if b is None: labels.append(None); continue
+        k = np.searchsorted(hit_idx, b[0])
+        if k < len(hit_idx) and hit_idx[k] < b[1]: labels.append(legend[first_legend[hit_idx[k]]]["name"])
+        else: labels.append(None)
+    return labels
+
+def detect_page_icons(page):
+    """Renderuje stronę i zwraca listę ikon [(rect, etykieta)] w kolejności get_image_info."""
+    pix = page.get_pixmap()
+    images = page.get_image_info(xrefs=True)
+    legend_y = page.rect.height * 0.9
+    candidates = []
+    for img in images:
+        bbox = fitz.Rect(img['bbox'])
+        if bbox.width < 8 or bbox.width > 80: continue
+        if bbox.y0 > legend_y: continue
+        candidates.append(bbox)
+    return [(bbox, lbl) for bbox, lbl in zip(candidates, classify_icons(pix, candidates)) if lbl]
+
+def _detect_icons_worker(input_pdf_path, page_numbers):
+    # Uruchamiane w procesie potomnym: każdy worker otwiera PDF samodzielnie
+    # i odsyła tylko prostokąty ikon i etykiety (krotki float -> bez strat przy pickle).
+    doc = fitz.open(input_pdf_path)
+    try:
+        return {pno: [(tuple(rect), lbl) for rect, lbl in detect_page_icons(doc[pno])] for pno in page_numbers}
+    finally:
+        doc.close()
+
+# Pula startuje procesy bez fork: proces Flask ma wątki (kolejka, automat, SSE) i połączenia SQLite,
+# a fork wielowątkowego procesu może zakleszczyć potomka na zablokowanym w chwili fork locku
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def detect_icons_parallel(input_pdf_path, page_count, workers):
+    """Dzieli strony na ciągłe bloki i rozpoznaje ikony w ProcessPoolExecutor."""
+    workers = max(1, min(workers, page_count))
+    chunk = math.ceil(page_count / workers)
+    blocks = [list(range(i, min(i + chunk, page_count))) for i in range(0, page_count, chunk)]
+    icons = {}
+    with ProcessPoolExecutor(max_workers=len(blocks), mp_context=multiprocessing.get_context(POOL_START_METHOD)) as pool:
+        for part in pool.map(_detect_icons_worker, [input_pdf_path] * len(blocks), blocks):
+            icons.update(part)
+    return {pno: [(fitz.Rect(rect), lbl) for rect, lbl in found] for pno, found in icons.items()}
+
+LABEL_FONT_SIZE = 10
+
+def make_text_width(custom_font=None):
+    """Szerokość napisu liczona raz dla każdej etykiety (jest ich kilka na cały dokument)."""
+    widths = {}
+    def text_width(txt):
+        if txt not in widths:
+            widths[txt] = custom_font.text_length(txt, fontsize=LABEL_FONT_SIZE) if custom_font is not None else fitz.get_text_length(txt, fontsize=LABEL_FONT_SIZE, fontname="Helvetica-Bold")
+        return widths[txt]
+    return text_width
+
+def layout_labels(icons, text_width):
+    """Pozycje podpisów [(tekst, x, y)] - te same co w pierwotnym algorytmie: napis stoi
+    5 pt na lewo od ikony, a gdy zachodzi na inną ikonę, przesuwa się na lewo od niej
+    (pierwsza kolidująca w kolejności listy), aż przestanie kolidować.
+
+    Zamiast sprawdzać za każdym razem wszystkie ikony strony, raz budujemy indeks ikon
+    posortowanych po y0. Kandydatami są tylko ikony z tego samego pasa wiersza (nachodzące
+    w pionie), leżące na lewo od startowej pozycji napisu - tylko one mogą kolidować,
+    bo napis przesuwa się wyłącznie w lewo."""
+    n = len(icons)
+    rects = [(r.x0, r.y0, r.x1, r.y1) for r, _ in icons]
+    valid = [not r.is_empty and not r.is_infinite for r, _ in icons]
+    order = sorted(range(n), key=lambda i: rects[i][1])
+    y0s = [rects[i][1] for i in order]
+    max_h = max((y1 - y0 for _, y0, _, y1 in rects), default=0)
+
+    placements = []
+    for i, (_, txt) in enumerate(icons):
+        if txt == "SKIP": continue
+        x0, y0, x1, y1 = rects[i]
+        tlen = text_width(txt)
+        right = x0 - 5
+        if y0 < y1:
+            # obs.y0 < y1 oraz obs.y1 > y0 (czyli obs.y0 > y0 - max_h) - okno w indeksie
+            lo, hi = bisect_right(y0s, y0 - max_h), bisect_left(y0s, y1)
+            cands = sorted(j for j in order[lo:hi] if j != i and valid[j] and rects[j][3] > y0 and rects[j][0] < right)
+            moved = bool(cands)
+            while moved:
+                moved = False
+                left = right - tlen
+                if not left < right: break  # pusty prostokąt napisu z niczym nie koliduje
+                for j in cands:
+                    if left < rects[j][2] and rects[j][0] < right:
+                        right = rects[j][0] - 5; moved = True; break
+        placements.append((txt, right - tlen, y1 - 2))
+    return placements
+
+def write_page_labels(page, icons, custom_font=None, text_width=None):
+    """Nakłada podpisy obok ikon, przesuwając je w lewo przy kolizji z inną ikoną."""
+    use_custom_font = custom_font is not None
+    text_width = text_width or make_text_width(custom_font)
+    writer = fitz.TextWriter(page.rect)
+    for txt, fx, fy in layout_labels(icons, text_width):
+        if use_custom_font: writer.append((fx, fy), txt, font=custom_font, fontsize=LABEL_FONT_SIZE)
+        else: page.insert_text((fx, fy), txt, fontsize=LABEL_FONT_SIZE, fontname="Helvetica-Bold", color=(0,0,0))
+    if use_custom_font: writer.write_text(page, color=(0, 0, 0))
+
+def load_label_font():
+    font_path = "C:/Windows/Fonts/arialbd.ttf"
+    if not os.path.exists(font_path): font_path = "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf"
+    if os.path.exists(font_path):
+        try: return fitz.Font(fontfile=font_path)
+        except: pass
+    return None
+
+# --- CACHE OPISANYCH PDF ---
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""): h.update(chunk)
+    return h.hexdigest()
+
+class PdfCache:
+    """Opisane PDF adresowane treścią: klucz to SHA-256 pobranego pliku + wersja etykietowania.
+    Ten sam harmonogram od miasta = gotowy plik z cache, bez ponownego opisywania.
+    Eviction LRU (czas ostatniego użycia w mtime) po przekroczeniu rozmiaru lub wieku."""
+
+    def __init__(self, directory, max_bytes, max_age_s):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key_for(self, original_pdf):
+        return f"{file_sha256(original_pdf)}-v{LABELER_VERSION}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def fetch(self, key, target):
+        """Kopiuje opisany PDF z cache pod target; False gdy brak wpisu."""
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                PDF_CACHE_REQUESTS.inc(result="miss")
+                return False
+            os.utime(path)
+            self.hits += 1
+            PDF_CACHE_REQUESTS.inc(result="hit")
+            # Kopiujemy pod blokadą, żeby evict() nie usunął pliku w trakcie
+            shutil.copyfile(path, target + ".part")
+        os.replace(target + ".part", target)
+        return True
+
+    def store(self, key, labeled_pdf):
+        path = self._path(key)
+        with self._lock:
+            # Katalog powstaje przy pierwszym zapisie - import modułu nie tworzy niczego na dysku
+            os.makedirs(self.directory, exist_ok=True)
+            shutil.copyfile(labeled_pdf, path + ".part")
+            os.replace(path + ".part", path)
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            now = time.time()
+            entries = []
+            for path in glob.glob(os.path.join(self.directory, "*.pdf")):
+                st = os.stat(path)
+                if now - st.st_mtime > self.max_age_s: os.remove(path)
+                else: entries.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes: break
+                os.remove(path)
+                total -= size
+
+    def stats_text(self):
+        return f"trafienia: {self.hits}, chybienia: {self.misses}"
+
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_MB * 1024 * 1024, PDF_CACHE_MAX_AGE_DAYS * 86400)
+
+def process_pdf_labels(input_pdf_path, output_pdf_path, workers=None):
+    """Opisuje ikony w PDF. Przy workers > 1 rozpoznawanie ikon idzie równolegle
+    w osobnych procesach, a zapis podpisów i pliku zawsze robi proces główny,
+    więc wynik jest identyczny jak w trybie szeregowym."""
+    try:
+        if workers is None: workers = PDF_WORKERS
+        doc = fitz.open(input_pdf_path)
+        custom_font = load_label_font()
+        if workers > 1 and doc.page_count >= PDF_PARALLEL_MIN_PAGES:
+            icons = detect_icons_parallel(input_pdf_path, doc.page_count, workers)
+        else:
+            icons = {page.number: detect_page_icons(page) for page in doc}
+        text_width = make_text_width(custom_font)
+        for page in doc:
+            write_page_labels(page, icons.get(page.number, []), custom_font, text_width)
+        # no_new_id: bez losowego /ID plik wynikowy jest powtarzalny bajt w bajt
+        doc.save(output_pdf_path, no_new_id=True)
+        doc.close()
+        return True
+    except: return False
@@ -0,0 +1,193 @@
+"""Pełny przebieg scrape -> opis PDF -> kalendarz oraz API biblioteki dla CLI i skryptów.
+Ciężkie moduły (Selenium, PyMuPDF, klienci Google) są importowane dopiero w funkcjach, które ich potrzebują."""
+import os
+import json
+import time
+import datetime
+import hashlib
+from contextlib import contextmanager
+
+from config import WASTE_COLORS
+from progress import update_progress, publish_log, current_job
+from state import state_store, address_dir, bump_sync_counter
+from metrics import span, STAGE_SECONDS, SYNC_RUNS
+
+# --- SYNCHRONIZACJA PRZYROSTOWA ---
+
+def schedule_fingerprint(schedule_data, allowed_types, pdf_path=None, calendar=True, user=None):
+    """SHA-256 z dat harmonogramu, filtra typów i treści opisanego PDF.
+    Przebieg bez Kalendarza Google (tylko ICS) i przebieg na koncie innego gospodarstwa (user) mają inny odcisk,
+    żeby późniejsza synchronizacja do tego kalendarza nie została pominięta."""
+    h = hashlib.sha256()
+    if not calendar: h.update(b"ics-only")
+    if user: h.update(f"user:{user}".encode("utf-8"))
+    h.update(json.dumps([list(item) for item in schedule_data], ensure_ascii=False).encode("utf-8"))
+    h.update(json.dumps(sorted(allowed_types or []), ensure_ascii=False).encode("utf-8"))
+    if pdf_path and os.path.exists(pdf_path):
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""): h.update(chunk)
+    return h.hexdigest()
+
+# --- API BIBLIOTEKI (scrape / label / sync) ---
+
+def make_step(timings, log):
+    """Context manager mierzący etap: czas trafia do timings[name], do logu i do /metrics."""
+    @contextmanager
+    def step(name):
+        t0 = time.perf_counter()
+        try:
+            with span(name): yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            timings[name] = round(elapsed, 3)
+            log(f"[czas] {name}: {elapsed:.2f} s")
+    return step
+
+def schedule_pairs(schedule):
+    """[(tekst_daty, rodzaj)] z listy par albo wpisów {"dateText", "wasteType"} (format scrape() i /api/last-state)."""
+    return [(item["dateText"], item["wasteType"]) if isinstance(item, dict) else tuple(item) for item in schedule]
+
+def scrape(address, pdf_target=None, log=print, backends=None, step=None):
+    """Pobiera harmonogram adresu; PDF tylko gdy podano pdf_target.
+    Zwraca {"address", "schedule": [{"dateText", "wasteType"}], "pdf": ścieżka albo None, "timings"}."""
+    from scraper import scrape_schedule  # requests; Selenium dopiero gdy HTTP zawiedzie
+    timings = {}
+    schedule_data, pdf_ok = scrape_schedule(address, pdf_target, log, step or make_step(timings, log), backends)
+    return {"address": address, "schedule": [{"dateText": txt, "wasteType": waste} for txt, waste in schedule_data],
+            "pdf": pdf_target if pdf_ok else None, "timings": timings}
+
+def label(input_pdf, output_pdf, workers=None, use_cache=True, log=print, step=None):
+    """Opisuje ikony w PDF, korzystając z cache opisanych plików. Ładuje tylko PyMuPDF/NumPy."""
+    from pdf_labels import pdf_cache, process_pdf_labels
+    if not use_cache: return process_pdf_labels(input_pdf, output_pdf, workers)
+    pdf_key = pdf_cache.key_for(input_pdf)
+    if pdf_cache.fetch(pdf_key, output_pdf):
+        log(f"Cache PDF: trafienie, pomijam opisywanie ({pdf_cache.stats_text()}).")
+        return True
+    with (step or span)("pdf_labels"): labeled = process_pdf_labels(input_pdf, output_pdf, workers)
+    if labeled: pdf_cache.store(pdf_key, output_pdf)
+    log(f"Cache PDF: chybienie ({pdf_cache.stats_text()}).")
+    return labeled
+
+def sync(schedule, allowed_types=None, log=print, user=None, address=None):
+    """Wysyła harmonogram do Kalendarza Google (tylko różnice) z tokenem zapisanym przez panel.
+    allowed_types=None - wszystkie rodzaje z WASTE_COLORS; user - gospodarstwo z własnym tokenem
+    (None = domyślny TOKEN_FILE); address - właściciel wydarzeń, wydarzenia innych adresów
+    w tym samym kalendarzu nie są zmieniane. Zwraca statystyki sync_calendar."""
+    from calendar_sync import get_google_service, sync_calendar
+    service = get_google_service(user)
+    if not service: raise Exception("Brak autoryzacji Google. Kliknij 'Połącz z Google' w panelu.")
+    if allowed_types is None: allowed_types = list(WASTE_COLORS.keys())
+    # Id kalendarza i kopia wydarzeń są osobne dla każdego konta Google
+    suffix = f":{user}" if user else ""
+    cal_stats, mirror = sync_calendar(service, schedule_pairs(schedule), allowed_types, log, cached_calendar_id=state_store.get_setting("calendar_id" + suffix),
+                                      mirror=state_store.get_setting("calendar_mirror" + suffix), user=user, address=address)
+    bump_sync_counter("full")
+    state_store.set_settings(**{"calendar_id" + suffix: cal_stats["calendar_id"], "calendar_mirror" + suffix: mirror})
+    return cal_stats
+
+# --- PROCES SYNCHRONIZACJI ---
+
+def run_full_process(address, allowed_types, force=False, user=None, calendar=True):
+    results = {
+        "status": "success", "logs": [], "added_events": 0, "schedule": [],
+        "pdf_available": False, "pdf_labeled_available": False,
+        "saved_address": address,
+        "allowed_types": allowed_types,
+        "user": user, "calendar": calendar
+    }
+    def log(msg):
+        ts = datetime.datetime.now().strftime("%H:%M:%S")
+        print(f"[{ts}] {msg}")
+        results["logs"].append(f"[{ts}] {msg}")
+        publish_log(f"[{ts}] {msg}")
+
+    results["timings"] = {}
+    run_start = time.perf_counter()
+    step = make_step(results["timings"], log)
+
+    try:
+        update_progress(5, "Pobieranie harmonogramu...")
+        log(f"--- START DLA: {address} ---")
+
+        # Każdy adres ma własny katalog w static/, więc równoległe zadania nie nadpisują sobie PDF.
+        # Pliki są podmieniane atomowo przez scraper, nie ma potrzeby ich wcześniej kasować.
+        addr_key, addr_dir = address_dir(address)
+        original_pdf = os.path.join(addr_dir, "harmonogram.pdf")
+        labeled_pdf = os.path.join(addr_dir, "harmonogram_opisany.pdf")
+        results["pdf_url"] = f"/static/{addr_key}/harmonogram.pdf"
+        results["pdf_labeled_url"] = f"/static/{addr_key}/harmonogram_opisany.pdf"
+        results["ics_url"] = f"/ics/{addr_key}.ics"
+        scraped = scrape(address, original_pdf, log, step=step)
+        pdf_ok = scraped["pdf"] is not None
+
+        if pdf_ok:
+            results["pdf_available"] = True
+            log("Pobrano PDF.")
+            update_progress(50, "Generowanie opisów PDF...")
+            if label(original_pdf, labeled_pdf, log=log, step=step):
+                results["pdf_labeled_available"] = True
+                log("PDF opisany pomyślnie.")
+
+        update_progress(60, "Analiza danych...")
+        schedule_data = schedule_pairs(scraped["schedule"])
+        results["schedule"] = scraped["schedule"]
+        for txt, waste_name in schedule_data:
+            log(f" -> Znaleziono: {waste_name} ({txt})")
+
+        if not schedule_data: raise Exception("Brak dat na stronie")
+
+        # Adres synchronizowany z Kalendarzem zostaje w tym trybie (results["calendar"]) także, gdy token
+        # wygasł - przebieg odświeża wtedy tylko kanał ICS, a odcisk "ics-only" nie pominie późniejszej synchronizacji
+        use_calendar = calendar
+        if calendar:
+            from google_auth import get_google_creds
+            if get_google_creds(user) is None:
+                log("Brak autoryzacji Google - pomijam Kalendarz, odświeżam tylko kanał ICS.")
+                use_calendar = False
+
+        # Bez zmian w harmonogramie (daty, filtr typów, opisany PDF) nie kontaktujemy się z Google
+        fingerprint = schedule_fingerprint(schedule_data, allowed_types, labeled_pdf if results["pdf_labeled_available"] else original_pdf if pdf_ok else None, use_calendar, user)
+        results["schedule_fingerprint"] = fingerprint
+        if not force and state_store.fingerprint(addr_key) == fingerprint:
+            bump_sync_counter("skipped")
+            results["sync_skipped"] = True
+            results['timestamp'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            log("Harmonogram bez zmian - pomijam synchronizację z Kalendarzem.")
+            SYNC_RUNS.inc(status="skipped")
+            results["run_id"] = state_store.record_run(results)
+            update_progress(100, "Bez zmian - kalendarz aktualny.", "finished")
+            return results
+
+        # Calendar
+        count = 0
+        if use_calendar:
+            update_progress(75, "Wysyłanie do Kalendarza...")
+            with step("calendar"): cal_stats = sync(schedule_data, allowed_types, log, user, address)
+            count = cal_stats["inserted"]
+            results["calendar_id"] = cal_stats["calendar_id"]
+            results["calendar_stats"] = cal_stats
+            results["added_events"] = count
+            # Bez zapisu odcisku - następny przebieg wyśle brakujące zmiany ponownie
+            if cal_stats.get("errors"): raise Exception(f"Kalendarz Google odrzucił {cal_stats['errors']} operacji")
+        else: log(f"Bez Kalendarza Google - harmonogram dostępny w kanale ICS: {results['ics_url']}")
+        results['timestamp'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        results["timings"]["total"] = round(time.perf_counter() - run_start, 3)
+        STAGE_SECONDS.observe(results["timings"]["total"], stage="total")
+        SYNC_RUNS.inc(status="success")
+        log(f"[czas] total: {results['timings']['total']:.2f} s")
+        log(f"--- SUKCES: Dodano {count} wydarzeń ---")
+        
+        results["run_id"] = state_store.record_run(results)
+        update_progress(100, "Zakończono pomyślnie!", "finished")
+
+    except Exception as e:
+        log(f"BŁĄD: {str(e)}")
+        results["status"] = "error"
+        results["message"] = str(e)
+        SYNC_RUNS.inc(status="error")
+        job = current_job()
+        update_progress(job.percent if job else 0, str(e), "error")
+        try: results["run_id"] = state_store.record_run(results)
+        except Exception as db_error: print(f"Błąd zapisu stanu: {db_error}")
+    return results
@@ -0,0 +1,75 @@
+"""Postęp zadań synchronizacji i jego strumień (SSE) - tylko biblioteka standardowa."""
+import queue
+import threading
+from collections import OrderedDict, deque
+
+from config import PROGRESS_REPLAY, PROGRESS_CHANNELS
+
+# --- STAN POSTĘPU (per zadanie) ---
+IDLE_PROGRESS = {"status": "idle", "percent": 0, "message": "Gotowy", "result": None}
+progress_lock = threading.Lock()
+_job_local = threading.local()
+
+def current_job():
+    """Zadanie obsługiwane przez bieżący wątek workera (None poza kolejką)."""
+    return getattr(_job_local, "job", None)
+
+class ProgressBus:
+    """Publish/subscribe dla postępu zadań. Każde zadanie ma kanał z numerowanymi
+    zdarzeniami (progress / log / done) i krótkim buforem do odtworzenia dla
+    spóźnionych subskrybentów. Wysyłane są tylko zmiany, nie cały stan."""
+
+    def __init__(self, replay=PROGRESS_REPLAY, channels=PROGRESS_CHANNELS):
+        self.replay = replay
+        self.max_channels = channels
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _channel(self, job_id):
+        ch = self._channels.get(job_id)
+        if ch is None:
+            ch = self._channels[job_id] = {"seq": 0, "buffer": deque(maxlen=self.replay), "subs": set()}
+            while len(self._channels) > self.max_channels:
+                old_id, old = next(iter(self._channels.items()))
+                if old["subs"]: break
+                del self._channels[old_id]
+        return ch
+
+    def publish(self, job_id, event, data):
+        with self._lock:
+            ch = self._channel(job_id)
+            ch["seq"] += 1
+            item = (ch["seq"], event, data)
+            ch["buffer"].append(item)
+            for q in list(ch["subs"]):
+                try: q.put_nowait(item)
+                except queue.Full: ch["subs"].discard(q)  # klient nie nadąża - rozłączamy, EventSource wznowi od Last-Event-ID
+
+    def subscribe(self, job_id, last_seq=0):
+        """Zwraca (kolejka_nowych_zdarzeń, zdarzenia_z_bufora_po_last_seq)."""
+        q = queue.Queue(maxsize=1000)
+        with self._lock:
+            ch = self._channel(job_id)
+            ch["subs"].add(q)
+            return q, [item for item in ch["buffer"] if item[0] > last_seq]
+
+    def unsubscribe(self, job_id, q):
+        with self._lock:
+            ch = self._channels.get(job_id)
+            if ch: ch["subs"].discard(q)
+
+progress_bus = ProgressBus()
+
+def update_progress(percent, message, status="running"):
+    job = current_job()
+    if job is None: return
+    with progress_lock:
+        if (job.percent, job.message, job.status) == (percent, message, status): return
+        job.percent = percent
+        job.message = message
+        job.status = status
+    progress_bus.publish(job.id, "progress", {"percent": percent, "message": message, "status": status})
+
+def publish_log(line):
+    job = current_job()
+    if job is not None: progress_bus.publish(job.id, "log", {"line": line})
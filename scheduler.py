@@ -0,0 +1,137 @@
+"""Automat: jedno wybudzenie na adres w wyliczonym terminie zamiast cogodzinnego sprawdzania stanu."""
+import heapq
+import random
+import hashlib
+import datetime
+import itertools
+import threading
+import traceback
+
+from config import AUTO_RUN_HOUR, AUTO_JITTER_MINUTES, AUTO_CATCHUP_SPREAD, AUTO_RETRY_MINUTES
+from dates import parse_schedule_dates
+from state import state_store, address_key, address_id
+
+def _parse_timestamp(value):
+    try: return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError): return None
+
+def address_jitter(address, day):
+    """Przesunięcie (s) stałe dla pary adres + dzień: po restarcie wypada ten sam termin,
+    a różne adresy rozkładają się w oknie AUTO_JITTER_MINUTES."""
+    if AUTO_JITTER_MINUTES <= 0: return 0
+    digest = hashlib.sha1(f"{address_id(address)}:{day.isoformat()}".encode("utf-8")).hexdigest()
+    return int(digest, 16) % (AUTO_JITTER_MINUTES * 60)
+
+def next_due(address, schedule, last_run=None):
+    """Termin kolejnego automatycznego przebiegu: dzień po najbliższym odbiorze, który nastąpił
+    nie wcześniej niż ostatni przebieg (wtedy strona 19115 pokazuje już następne daty).
+    Bez takiego odbioru (harmonogram nieaktualny lub pusty) - dzień po ostatnim przebiegu.
+    Zwraca (termin, powód)."""
+    base = (last_run or datetime.datetime.now()).date()
+    # Rok dat bez roku ustalamy względem dnia pobrania harmonogramu, nie dnia planowania
+    pickups = [d for d, _ in parse_schedule_dates(((item["dateText"], item["wasteType"]) for item in schedule), base) if d >= base]
+    if pickups:
+        pickup = min(pickups)
+        day, reason = pickup + datetime.timedelta(days=1), f"po odbiorze {pickup.isoformat()}"
+    else:
+        day, reason = base + datetime.timedelta(days=1), "odświeżenie harmonogramu"
+    due = datetime.datetime.combine(day, datetime.time(AUTO_RUN_HOUR)) + datetime.timedelta(seconds=address_jitter(address, day))
+    return due, reason
+
+class WakeScheduler:
+    """Kolejka priorytetowa (termin, adres) z dokładnie jednym aktualnym wpisem na adres.
+    Wątek śpi do najbliższego terminu (albo do zmiany planu), uruchamia przebieg przez submit()
+    i czeka, aż po jego zakończeniu plan() wyliczy następny termin z odświeżonego harmonogramu.
+    Po starcie terminy są liczone od nowa z bazy stanu; te, które minęły w czasie przestoju,
+    są nadrabiane od razu, rozłożone losowo w AUTO_CATCHUP_SPREAD sekund."""
+
+    def __init__(self, submit):
+        self.submit = submit      # submit(adres, typy, user, calendar) - wstawia zadanie do kolejki synchronizacji
+        self._heap = []
+        self._entries = {}        # klucz adresu -> aktualny wpis; starsze wpisy w kopcu są pomijane
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _push(self, address, allowed_types, due, reason, user=None, calendar=True):
+        entry = {"due": due, "seq": next(self._seq), "address": address, "allowed_types": allowed_types, "reason": reason, "user": user, "calendar": calendar}
+        with self._cond:
+            self._entries[address_key(address)] = entry
+            heapq.heappush(self._heap, (due, entry["seq"], entry))
+            self._cond.notify()
+        return entry
+
+    def plan(self, address, item=None, now=None):
+        """Wylicza i ustawia termin dla adresu (zastępuje poprzedni). Bez automatu - usuwa adres z planu.
+        item - wpis z state_store.list_schedules(); bez niego czytany z bazy stanu. Termin liczymy od chwili
+        pobrania harmonogramu; gdy ostatni przebieg się nie udał, ponawiamy go po AUTO_RETRY_MINUTES."""
+        if not state_store.get_setting("auto_mode"):
+            self.cancel(address)
+            return None
+        if item is None:
+            item = next((s for s in state_store.list_schedules() if address_key(s["address"]) == address_key(address)), None)
+            if not item: return None
+        now = now or datetime.datetime.now()
+        updated_at, last_run = _parse_timestamp(item["updated_at"]), _parse_timestamp(item["last_run"])
+        due, reason = next_due(address, item["schedule"], updated_at or last_run)
+        if item["last_status"] != "success" or (last_run and updated_at and last_run > updated_at):
+            # Ostatni przebieg nie odświeżył harmonogramu (błąd) - ponawiamy później, nie czekamy do kolejnego odbioru
+            due, reason = max(now, last_run + datetime.timedelta(minutes=AUTO_RETRY_MINUTES)) if last_run else now, "ponowna próba po nieudanym przebiegu"
+        elif due <= now:
+            due, reason = now + datetime.timedelta(seconds=random.uniform(0, AUTO_CATCHUP_SPREAD)), f"nadrobienie ({reason})"
+        return self._push(address, item["allowed_types"], due, reason, item["user"], item["calendar"])
+
+    def cancel(self, address):
+        with self._cond:
+            if self._entries.pop(address_key(address), None): self._cond.notify()
+
+    def reload(self):
+        """Plan od nowa z bazy stanu - przy starcie i po przełączeniu automatu."""
+        with self._cond:
+            self._entries.clear()
+            self._heap.clear()
+            self._cond.notify()
+        if not state_store.get_setting("auto_mode"): return
+        now = datetime.datetime.now()
+        for item in state_store.list_schedules(): self.plan(item["address"], item, now)
+
+    def upcoming(self):
+        with self._cond: entries = sorted(self._entries.values(), key=lambda e: e["due"])
+        now = datetime.datetime.now()
+        return [{"address": e["address"], "due": e["due"].strftime("%Y-%m-%d %H:%M:%S"), "due_in_s": max(0, int((e["due"] - now).total_seconds())),
+                 "reason": e["reason"], "allowed_types": e["allowed_types"], "user": e["user"], "calendar": e["calendar"]} for e in entries]
+
+    def start(self):
+        if self._thread: return
+        self.reload()
+        self._thread = threading.Thread(target=self._loop, name="wake-scheduler", daemon=True)
+        self._thread.start()
+
+    def _pop_due(self):
+        """Czeka na najbliższy aktualny wpis, którego termin minął, i zdejmuje go z planu."""
+        with self._cond:
+            while True:
+                while self._heap and self._entries.get(address_key(self._heap[0][2]["address"])) is not self._heap[0][2]:
+                    heapq.heappop(self._heap)  # wpis zastąpiony nowszym planem lub anulowany
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wait = (self._heap[0][0] - datetime.datetime.now()).total_seconds()
+                if wait > 0:
+                    self._cond.wait(timeout=min(wait, 3600))
+                    continue
+                entry = heapq.heappop(self._heap)[2]
+                del self._entries[address_key(entry["address"])]
+                return entry
+
+    def _loop(self):
+        while True:
+            entry = self._pop_due()
+            try:
+                if not state_store.get_setting("auto_mode"): continue
+                print(f"Automat: start dla {entry['address']} ({entry['reason']}).")
+                self.submit(entry["address"], entry["allowed_types"], entry["user"], entry["calendar"])
+            except Exception as e:
+                print(f"Automat: błąd dla {entry['address']}: {e}")
+                traceback.print_exc()
+                self._push(entry["address"], entry["allowed_types"], datetime.datetime.now() + datetime.timedelta(minutes=AUTO_RETRY_MINUTES), "ponowna próba po błędzie", entry["user"], entry["calendar"])
@@ -0,0 +1,190 @@
+"""Pobieranie harmonogramu: klient HTTP portletu 19115, a Selenium (browser.py) jako zapas."""
+import os
+import datetime
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import SCRAPER_BASE_URL, SCHEDULE_PORTLET_ID, SCRAPER_BACKENDS, HTTP_TIMEOUT, HTTP_POOL_SIZE, SCHEDULE_ELEMENT_IDS
+from progress import update_progress
+from metrics import SCRAPER_ATTEMPTS
+
+# --- KLIENT HTTP ---
+
+_http_session = None
+_http_session_lock = threading.Lock()
+# Zapytania POST portletu (podpowiedzi adresu, harmonogram) tylko czytają dane, więc można je ponawiać
+RETRY_METHODS = frozenset({"GET", "POST"})
+
+def get_http_session():
+    """Jedna requests.Session na proces - pula połączeń keep-alive do portalu."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=RETRY_METHODS))
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            sess.headers["User-Agent"] = "Mozilla/5.0 (X11; Linux x86_64) WasteScheduleExporter"
+            _http_session = sess
+        return _http_session
+
+# Ciasteczka portalu (JSESSIONID) z ostatniego udanego pobrania; każde pobranie dostaje ich kopię
+_portal_cookies = None
+_portal_cookies_lock = threading.Lock()
+
+def fetch_session():
+    """Sesja jednego pobrania: własne ciasteczka na wspólnej puli połączeń (adaptery z get_http_session).
+    Nie zamykać - close() zamknąłby współdzielone adaptery."""
+    shared = get_http_session()
+    sess = requests.Session()
+    sess.adapters = shared.adapters
+    sess.headers = shared.headers
+    with _portal_cookies_lock: cookies = _portal_cookies
+    if cookies is not None: sess.cookies.update(cookies)
+    return sess, cookies
+
+def stream_pdf_to_file(response, pdf_target):
+    """Zapisuje odpowiedź strumieniowo do pliku tymczasowego i podmienia go atomowo."""
+    tmp_path = pdf_target + ".part"
+    first = True
+    with open(tmp_path, "wb") as f:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if first:
+                if not chunk.startswith(b"%PDF"):
+                    f.close(); os.remove(tmp_path)
+                    return False
+                first = False
+            f.write(chunk)
+    if first:
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, pdf_target)
+    return True
+
+FRACTION_KEYWORDS = [("papier", "Papier"), ("metal", "Metale i tworzywa sztuczne"), ("tworzyw", "Metale i tworzywa sztuczne"),
+                     ("szk", "Szkło"), ("bio", "Bio"), ("zmiesz", "Zmieszane"), ("zielon", "Zielone")]
+MONTH_GENITIVE = ['stycznia', 'lutego', 'marca', 'kwietnia', 'maja', 'czerwca', 'lipca', 'sierpnia', 'września', 'października', 'listopada', 'grudnia']
+
+def _iter_http_pickups(node):
+    # Odpowiedź portalu to zagnieżdżone listy/słowniki; wpis odbioru ma datę i frakcję
+    if isinstance(node, list):
+        for item in node: yield from _iter_http_pickups(item)
+    elif isinstance(node, dict):
+        date_val = node.get("data", node.get("date"))
+        fraction = node.get("frakcja", node.get("fraction"))
+        if isinstance(date_val, str) and fraction:
+            if isinstance(fraction, dict): fraction = " ".join(str(fraction.get(k, "")) for k in ("nazwa", "name", "id_frakcja"))
+            yield date_val, str(fraction)
+        else:
+            for value in node.values(): yield from _iter_http_pickups(value)
+
+def parse_http_schedule(payload, today=None):
+    """Z odpowiedzi JSON wybiera najbliższy przyszły termin dla każdego rodzaju odpadu
+    i zwraca go w tym samym formacie tekstowym co strona (np. '15 stycznia 2025')."""
+    today = today or datetime.date.today()
+    nearest = {}
+    for date_val, fraction in _iter_http_pickups(payload):
+        try: d = datetime.date.fromisoformat(date_val[:10])
+        except ValueError: continue
+        if d < today: continue
+        low = fraction.lower()
+        waste = next((name for key, name in FRACTION_KEYWORDS if key in low), None)
+        if waste and (waste not in nearest or d < nearest[waste]): nearest[waste] = d
+    order = list(SCHEDULE_ELEMENT_IDS.values())
+    return [(f"{d.day} {MONTH_GENITIVE[d.month - 1]} {d.year}", waste) for waste, d in sorted(nearest.items(), key=lambda kv: order.index(kv[0]))]
+
+# --- SCRAPERY (HTTP, Selenium jako zapas) ---
+
+class ScraperBackend:
+    """Źródło harmonogramu dla adresu. fetch() zwraca ([(tekst_daty, rodzaj)], czy_pobrano_pdf)
+    i zapisuje PDF pod pdf_target (None - bez PDF). Wyjątek oznacza przejście do kolejnego backendu."""
+    name = "base"
+
+    def fetch(self, address, pdf_target, log, step):
+        raise NotImplementedError
+
+class HttpScraper(ScraperBackend):
+    """Woła bezpośrednio endpointy portletu harmonogramów (autocomplete, harmonogram, PDF)
+    przez współdzieloną pulę połączeń requests - bez uruchamiania przeglądarki."""
+    name = "http"
+
+    def _resource_url(self, resource_id):
+        return (f"{SCRAPER_BASE_URL}?p_p_id={SCHEDULE_PORTLET_ID}&p_p_lifecycle=2&p_p_state=normal"
+                f"&p_p_mode=view&p_p_resource_id={resource_id}&p_p_cacheability=cacheLevelPage")
+
+    def _param(self, name):
+        return f"_{SCHEDULE_PORTLET_ID}_{name}"
+
+    def fetch(self, address, pdf_target, log, step):
+        global _portal_cookies
+        sess, cookies = fetch_session()
+        try: result = self._fetch(sess, address, pdf_target, log, step)
+        except Exception:
+            # Wygasła sesja portalu (JSESSIONID) - następna próba zacznie od strony głównej z nowymi ciasteczkami.
+            # Tylko gdy to były nasze ciasteczka: równoległe zadania mają własne kopie, a nowszych nie ruszamy.
+            with _portal_cookies_lock:
+                if _portal_cookies is cookies: _portal_cookies = None
+            raise
+        with _portal_cookies_lock: _portal_cookies = sess.cookies.copy()
+        return result
+
+    def _fetch(self, sess, address, pdf_target, log, step):
+        update_progress(10, "Pobieranie strony...")
+        with step("page_load"):
+            # Pierwsze wejście ustawia ciasteczka sesji portalu; później przychodzą z poprzedniego pobrania
+            if not sess.cookies: sess.get(SCRAPER_BASE_URL, timeout=HTTP_TIMEOUT).raise_for_status()
+
+        update_progress(20, "Szukanie adresu...")
+        with step("address_select"):
+            r = sess.post(self._resource_url("autocompleteResourceURL"), data={self._param("name"): address}, timeout=HTTP_TIMEOUT)
+            r.raise_for_status()
+            suggestions = r.json()
+            if not suggestions: raise Exception("Brak podpowiedzi adresu!")
+            point = suggestions[0]
+            point_id = point.get("addressPointId", point.get("id"))
+            if point_id is None: raise Exception("Nieznany format podpowiedzi adresu")
+            log(f"Wybrano: {point.get('name', point_id)}")
+
+        update_progress(30, "Pobieranie harmonogramu...")
+        with step("schedule_render"):
+            r = sess.post(self._resource_url("ajaxResourceURL"), data={self._param("addressPointId"): point_id}, timeout=HTTP_TIMEOUT)
+            r.raise_for_status()
+            schedule_data = parse_http_schedule(r.json())
+        if not schedule_data: raise Exception("Brak dat w odpowiedzi serwera")
+
+        pdf_ok = False
+        if not pdf_target: return schedule_data, pdf_ok
+        update_progress(40, "Pobieranie PDF...")
+        with step("pdf_download"):
+            try:
+                with sess.get(self._resource_url("pdfResourceURL"), params={self._param("addressPointId"): point_id}, stream=True, timeout=HTTP_TIMEOUT) as r:
+                    r.raise_for_status()
+                    pdf_ok = stream_pdf_to_file(r, pdf_target)
+                if not pdf_ok: log("Serwer nie zwrócił pliku PDF.")
+            except Exception as e: log(f"Błąd PDF: {e}")
+        return schedule_data, pdf_ok
+
+def _selenium_scraper():
+    from browser import SeleniumScraper  # Selenium ładujemy dopiero, gdy HTTP zawiedzie
+    return SeleniumScraper()
+
+SCRAPER_REGISTRY = {"http": HttpScraper, "selenium": _selenium_scraper}
+
+def scrape_schedule(address, pdf_target, log, step, backends=None):
+    """Próbuje kolejnych backendów z SCRAPER_BACKENDS (lub backends) aż któryś zwróci daty."""
+    last_error = None
+    for name in backends or SCRAPER_BACKENDS:
+        backend = SCRAPER_REGISTRY[name]()
+        try:
+            schedule_data, pdf_ok = backend.fetch(address, pdf_target, log, step)
+            if not schedule_data: raise Exception("Brak dat na stronie")
+            SCRAPER_ATTEMPTS.inc(backend=name, result="ok")
+            log(f"Harmonogram pobrany przez: {name}")
+            return schedule_data, pdf_ok
+        except Exception as e:
+            SCRAPER_ATTEMPTS.inc(backend=name, result="error")
+            last_error = e
+            log(f"Scraper '{name}' nie zadziałał: {e}")
+    raise last_error or Exception("Brak skonfigurowanych scraperów")
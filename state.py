@@ -0,0 +1,253 @@
+"""Stan aplikacji w SQLite i identyfikatory adresów."""
+import os
+import json
+import datetime
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from config import STATIC_DIR, STATE_DB, STATE_FILE, LOG_RETENTION_RUNS, RUN_RETENTION
+
+def address_key(address):
+    """Znormalizowany adres - klucz deduplikacji zadań i katalogu plików adresu."""
+    return " ".join((address or "").lower().split())
+
+def address_id(address):
+    """Krótki, stały identyfikator adresu (nazwa katalogu w static/, klucz w bazie stanu)."""
+    return hashlib.sha1(address_key(address).encode("utf-8")).hexdigest()[:12]
+
+def address_dir(address):
+    key = address_id(address)
+    path = os.path.join(STATIC_DIR, key)
+    os.makedirs(path, exist_ok=True)
+    return key, path
+
+# --- MAGAZYN STANU (SQLite) ---
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS schedules (
+    address_key TEXT PRIMARY KEY, address TEXT NOT NULL, schedule TEXT NOT NULL, allowed_types TEXT,
+    pdf_available INTEGER DEFAULT 0, pdf_labeled_available INTEGER DEFAULT 0, pdf_url TEXT, pdf_labeled_url TEXT,
+    fingerprint TEXT, updated_at TEXT, user TEXT, calendar INTEGER DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS sync_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, address_key TEXT, address TEXT, status TEXT, message TEXT,
+    added_events INTEGER DEFAULT 0, skipped INTEGER DEFAULT 0, timestamp TEXT, timings TEXT, calendar_stats TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sync_runs_address ON sync_runs (address_key, id);
+CREATE TABLE IF NOT EXISTS log_lines (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id INTEGER NOT NULL, line TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_log_lines_run ON log_lines (run_id, id);
+"""
+
+# Kolumny dodane po pierwszym wydaniu - w istniejących bazach dopisywane przez ALTER TABLE
+STATE_COLUMNS = {"schedules": {"user": "TEXT", "calendar": "INTEGER DEFAULT 1"}}
+
+DEFAULT_SETTINGS = {"auto_mode": False, "last_auto_run": "", "saved_address": "", "allowed_types": None, "calendar_id": None, "calendar_mirror": None}
+
+class StateStore:
+    """Stan aplikacji w SQLite (WAL): ustawienia jako osobne klucze, harmonogram per adres,
+    historia synchronizacji i linie logów. Każdy wątek ma własne połączenie; zapisy
+    są krótkimi transakcjami, więc toggle_auto i trwająca synchronizacja nie nadpisują sobie zmian."""
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(STATE_SCHEMA)
+                    self._add_columns(conn)
+                    self._migrate_json(conn)
+                    self._initialized = True
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- ustawienia ---
+
+    def get_setting(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        if row is None: return DEFAULT_SETTINGS.get(key, default) if default is None else default
+        return json.loads(row["value"])
+
+    def set_settings(self, **values):
+        with self._tx() as conn:
+            conn.executemany("INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                             [(k, json.dumps(v, ensure_ascii=False)) for k, v in values.items()])
+
+    def settings(self):
+        values = dict(DEFAULT_SETTINGS)
+        for row in self._conn().execute("SELECT key, value FROM settings"): values[row["key"]] = json.loads(row["value"])
+        return values
+
+    # --- harmonogramy i przebiegi ---
+
+    def fingerprint(self, addr_key):
+        row = self._conn().execute("SELECT fingerprint FROM schedules WHERE address_key = ?", (addr_key,)).fetchone()
+        return row["fingerprint"] if row else None
+
+    def record_run(self, results):
+        """Zapisuje wynik przebiegu: wiersz sync_runs z logami, a przy sukcesie także
+        harmonogram adresu i ustawienia (zapamiętany adres, kalendarz, kopia wydarzeń)."""
+        address = results.get("saved_address") or ""
+        addr_key = address_id(address)
+        ok = results.get("status") == "success"
+        timestamp = results.get("timestamp") or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._tx() as conn:
+            cur = conn.execute(
+                "INSERT INTO sync_runs (address_key, address, status, message, added_events, skipped, timestamp, timings, calendar_stats) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (addr_key, address, results.get("status"), results.get("message"), results.get("added_events", 0), int(bool(results.get("sync_skipped"))),
+                 timestamp, json.dumps(results.get("timings")), json.dumps(results.get("calendar_stats"))))
+            run_id = cur.lastrowid
+            conn.executemany("INSERT INTO log_lines (run_id, line) VALUES (?, ?)", [(run_id, line) for line in results.get("logs", [])])
+            if ok:
+                conn.execute(
+                    """INSERT INTO schedules (address_key, address, schedule, allowed_types, pdf_available, pdf_labeled_available, pdf_url, pdf_labeled_url, fingerprint, updated_at, user, calendar)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(address_key) DO UPDATE SET address = excluded.address, schedule = excluded.schedule, allowed_types = excluded.allowed_types,
+                       pdf_available = excluded.pdf_available, pdf_labeled_available = excluded.pdf_labeled_available, pdf_url = excluded.pdf_url,
+                       pdf_labeled_url = excluded.pdf_labeled_url, fingerprint = excluded.fingerprint, updated_at = excluded.updated_at, user = excluded.user, calendar = excluded.calendar""",
+                    (addr_key, address, json.dumps(results.get("schedule", []), ensure_ascii=False), json.dumps(results.get("allowed_types")),
+                     int(results.get("pdf_available", False)), int(results.get("pdf_labeled_available", False)), results.get("pdf_url"), results.get("pdf_labeled_url"),
+                     results.get("schedule_fingerprint"), timestamp, results.get("user"), int(results.get("calendar", True))))
+                settings = {"saved_address": address, "allowed_types": results.get("allowed_types")}
+                if results.get("calendar_id"): settings["calendar_id" + (f":{results['user']}" if results.get("user") else "")] = results["calendar_id"]
+                conn.executemany("INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                                 [(k, json.dumps(v, ensure_ascii=False)) for k, v in settings.items()])
+            self._apply_retention(conn)
+        return run_id
+
+    def _apply_retention(self, conn):
+        # Logi trzymamy dla LOG_RETENTION_RUNS ostatnich przebiegów, same przebiegi dla RUN_RETENTION
+        row = conn.execute("SELECT id FROM sync_runs ORDER BY id DESC LIMIT 1 OFFSET ?", (LOG_RETENTION_RUNS,)).fetchone()
+        if row: conn.execute("DELETE FROM log_lines WHERE run_id <= ?", (row["id"],))
+        row = conn.execute("SELECT id FROM sync_runs ORDER BY id DESC LIMIT 1 OFFSET ?", (RUN_RETENTION,)).fetchone()
+        if row: conn.execute("DELETE FROM sync_runs WHERE id <= ?", (row["id"],))
+
+    def list_schedules(self):
+        """Wszystkie adresy z zapisanym harmonogramem (po udanej synchronizacji), gospodarstwem (user)
+        i trybem (calendar - z Kalendarzem Google czy tylko ICS) ostatniego udanego przebiegu.
+        updated_at - chwila pobrania harmonogramu; last_run/last_status - ostatni przebieg, także nieudany."""
+        rows = self._conn().execute(
+            """SELECT s.address, s.schedule, s.allowed_types, s.updated_at, s.user, s.calendar, r.timestamp AS last_run, r.status AS last_status
+               FROM schedules s LEFT JOIN sync_runs r ON r.id = (SELECT MAX(id) FROM sync_runs WHERE address_key = s.address_key)""")
+        return [{"address": row["address"], "schedule": json.loads(row["schedule"]), "allowed_types": json.loads(row["allowed_types"]) if row["allowed_types"] else None,
+                 "user": row["user"], "calendar": row["calendar"] is None or bool(row["calendar"]), "updated_at": row["updated_at"],
+                 "last_run": row["last_run"] or row["updated_at"], "last_status": row["last_status"] or "success"} for row in rows]
+
+    def schedule_for(self, address):
+        return self.schedule_by_id(address_id(address))
+
+    def schedule_by_id(self, addr_id):
+        row = self._conn().execute("SELECT * FROM schedules WHERE address_key = ?", (addr_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest_run(self, address=None):
+        if address is None: row = self._conn().execute("SELECT * FROM sync_runs ORDER BY id DESC LIMIT 1").fetchone()
+        else: row = self._conn().execute("SELECT * FROM sync_runs WHERE address_key = ? ORDER BY id DESC LIMIT 1", (address_id(address),)).fetchone()
+        return dict(row) if row else None
+
+    def list_runs(self, address=None, limit=20, offset=0):
+        if address is None: rows = self._conn().execute("SELECT * FROM sync_runs ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset))
+        else: rows = self._conn().execute("SELECT * FROM sync_runs WHERE address_key = ? ORDER BY id DESC LIMIT ? OFFSET ?", (address_id(address), limit, offset))
+        return [self._run_dict(row) for row in rows]
+
+    def logs(self, run_id, limit=500, offset=0):
+        rows = self._conn().execute("SELECT line FROM log_lines WHERE run_id = ? ORDER BY id LIMIT ? OFFSET ?", (run_id, limit, offset))
+        return [row["line"] for row in rows]
+
+    def _run_dict(self, row):
+        run = dict(row)
+        run["timings"] = json.loads(run["timings"]) if run.get("timings") else None
+        run["calendar_stats"] = json.loads(run["calendar_stats"]) if run.get("calendar_stats") else None
+        return run
+
+    def load_state(self):
+        """Widok zgodny z dawnym last_state.json (bez kopii wydarzeń kalendarza):
+        ustawienia + ostatni poprawny harmonogram i ostatni przebieg zapamiętanego adresu."""
+        settings = self.settings()
+        for key in [k for k in settings if k == "calendar_mirror" or k.startswith("calendar_mirror:")]: settings.pop(key)
+        state = {"schedule": [], "logs": [], "pdf_available": False, "pdf_labeled_available": False, **settings}
+        address = settings.get("saved_address")
+        sched = self.schedule_for(address) if address else None
+        if sched:
+            state.update({"schedule": json.loads(sched["schedule"]), "pdf_available": bool(sched["pdf_available"]),
+                          "pdf_labeled_available": bool(sched["pdf_labeled_available"]), "pdf_url": sched["pdf_url"],
+                          "pdf_labeled_url": sched["pdf_labeled_url"], "schedule_fingerprint": sched["fingerprint"],
+                          "ics_url": f"/ics/{sched['address_key']}.ics"})
+        run = self.latest_run(address) if address else self.latest_run()
+        if run:
+            state.update({"run_id": run["id"], "status": run["status"], "added_events": run["added_events"], "timestamp": run["timestamp"],
+                          "logs": self.logs(run["id"])})
+            if run["message"]: state["message"] = run["message"]
+        return state
+
+    def _add_columns(self, conn):
+        for table, columns in STATE_COLUMNS.items():
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, decl in columns.items():
+                if name not in existing: conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+    def _migrate_json(self, conn):
+        """Jednorazowe przeniesienie danych z last_state.json; plik dostaje końcówkę .migrated."""
+        if not self.legacy_json or not os.path.exists(self.legacy_json): return
+        if conn.execute("SELECT 1 FROM settings LIMIT 1").fetchone(): return
+        try:
+            with open(self.legacy_json, 'r', encoding='utf-8') as f: old = json.load(f)
+        except Exception as e:
+            print(f"Nie udało się wczytać {self.legacy_json}: {e}")
+            return
+        address = old.get("saved_address") or ""
+        settings = {k: old[k] for k in DEFAULT_SETTINGS if old.get(k) is not None}
+        settings.setdefault("auto_mode", False)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", [(k, json.dumps(v, ensure_ascii=False)) for k, v in settings.items()])
+        if address:
+            addr_key = address_id(address)
+            fingerprint = (old.get("sync_fingerprints") or {}).get(addr_key)
+            conn.execute("INSERT OR REPLACE INTO schedules (address_key, address, schedule, allowed_types, pdf_available, pdf_labeled_available, pdf_url, pdf_labeled_url, fingerprint, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (addr_key, address, json.dumps(old.get("schedule", []), ensure_ascii=False), json.dumps(old.get("allowed_types")),
+                          int(old.get("pdf_available", False)), int(old.get("pdf_labeled_available", False)), old.get("pdf_url"), old.get("pdf_labeled_url"),
+                          fingerprint, old.get("timestamp")))
+            cur = conn.execute("INSERT INTO sync_runs (address_key, address, status, message, added_events, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                               (addr_key, address, old.get("status", "success"), old.get("message"), old.get("added_events", 0), old.get("timestamp")))
+            conn.executemany("INSERT INTO log_lines (run_id, line) VALUES (?, ?)", [(cur.lastrowid, line) for line in old.get("logs", [])])
+        conn.execute("COMMIT")
+        os.replace(self.legacy_json, self.legacy_json + ".migrated")
+        print(f"Przeniesiono stan z {self.legacy_json} do {self.path}.")
+
+state_store = StateStore(STATE_DB, legacy_json=STATE_FILE)
+
+def load_state():
+    return state_store.load_state()
+
+# --- LICZNIKI SYNCHRONIZACJI ---
+
+# skipped: harmonogram bez zmian (bez kontaktu z Google), full: synchronizacja z kalendarzem
+sync_counters = {"skipped": 0, "full": 0, "calendar_full_reads": 0, "calendar_incremental_reads": 0}
+sync_counters_lock = threading.Lock()
+
+def bump_sync_counter(name):
+    with sync_counters_lock: sync_counters[name] += 1
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+@pytest.fixture(autouse=True)
+def _workdir(tmp_path, monkeypatch):
+    # Pliki względne (state.db, tokeny) lądują w katalogu tymczasowym testu, nie w repozytorium
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture
+def webapp(tmp_path, monkeypatch):
+    # Import dopiero po zmianie katalogu (autouse _workdir) i z bazą stanu testu - bez last_state.json dewelopera
+    import app
+    import state, ics_feed, pipeline, scheduler
+    store = state.StateStore(str(tmp_path / "state.db"))
+    for module in (state, app, ics_feed, pipeline, scheduler): monkeypatch.setattr(module, "state_store", store)
+    # Kanały ICS też w katalogu testu (ICS_DIR jest ścieżką bezwzględną w repozytorium)
+    monkeypatch.setattr(app, "ics_cache", ics_feed.IcsFeedCache(str(tmp_path / "ics_cache"), 10))
+    return app
+
+@pytest.fixture
+def client(webapp):
+    return webapp.app.test_client()
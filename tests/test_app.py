@@ -0,0 +1,27 @@
+import threading
+
+import pytest
+
+@pytest.mark.parametrize("query, expected", [
+    ("", (20, 0)), ("?limit=abc&offset=xyz", (20, 0)), ("?limit=-5&offset=-3", (1, 0)),
+    ("?limit=0", (1, 0)), ("?limit=100000&offset=7", (200, 7)),
+])
+def test_runs_paging_is_parsed_and_clamped(client, query, expected):
+    resp = client.get(f"/api/runs{query}")
+    assert resp.status_code == 200
+    assert (resp.json["limit"], resp.json["offset"]) == expected
+
+def test_run_logs_limit_is_capped(client):
+    resp = client.get("/api/runs/1/logs?limit=99999&offset=-1")
+    assert resp.status_code == 200
+    assert (resp.json["limit"], resp.json["offset"]) == (5000, 0)
+
+def test_import_has_no_side_effects(webapp, tmp_path):
+    assert webapp.wake_scheduler._thread is None
+    assert not any(t.name == "wake-scheduler" for t in threading.enumerate())
+
+def test_login_rejects_invalid_user_without_storing_it(client):
+    assert client.get("/login?user=../evil").status_code == 400
+    with client.session_transaction() as sess: assert "user" not in sess
+    resp = client.get("/api/auth-status")
+    assert resp.status_code == 200 and resp.json["user"] is None
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+import browser
+from browser import BrowserPool, BrowserSession
+
+class FakeDriver:
+    def __init__(self):
+        self.closed = False
+    def get(self, url): pass
+    def execute_cdp_cmd(self, cmd, params): pass
+    def execute_script(self, script):
+        if self.closed: raise RuntimeError("sesja zamknięta")
+        return 1
+    def quit(self): self.closed = True
+
+class FakePool(BrowserPool):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.started = 0
+    def _new_session(self):
+        self.started += 1
+        return BrowserSession(FakeDriver())
+
+@pytest.fixture(autouse=True)
+def _download_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(browser, "DOWNLOAD_DIR", str(tmp_path))
+
+def acquire_in_thread(pool, timeout):
+    result = {}
+    def run():
+        t0 = time.monotonic()
+        try: result["sess"] = pool.acquire(timeout=timeout)
+        except Exception as e: result["error"] = e
+        result["waited"] = time.monotonic() - t0
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+def test_waiter_gets_new_session_when_holder_recycles():
+    pool = FakePool(1, 1, 0)  # jedna przeglądarka, zamykana po każdym użyciu
+    first = pool.acquire(timeout=1)
+    thread, result = acquire_in_thread(pool, timeout=10)
+    time.sleep(0.2)
+    pool.release(first)  # BROWSER_MAX_USES osiągnięte - sesja zamknięta, miejsce wolne
+    thread.join(5)
+    assert "error" not in result and result["waited"] < 2
+    assert first.driver.closed and result["sess"] is not first and pool.started == 2
+
+def test_waiter_reuses_returned_session():
+    pool = FakePool(1, 10, 0)
+    first = pool.acquire(timeout=1)
+    thread, result = acquire_in_thread(pool, timeout=10)
+    time.sleep(0.2)
+    pool.release(first)
+    thread.join(5)
+    assert result["sess"] is first and result["waited"] < 2 and pool.started == 1
+
+def test_acquire_times_out_when_pool_stays_full():
+    pool = FakePool(1, 10, 0)
+    pool.acquire(timeout=1)
+    with pytest.raises(Exception, match="Brak wolnej przeglądarki"): pool.acquire(timeout=0.3)
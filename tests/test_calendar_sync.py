@@ -0,0 +1,106 @@
+import datetime
+import threading
+
+import pytest
+
+import calendar_sync
+from calendar_sync import event_body, event_owner, sync_calendar
+from fixtures import FakeCalendarService
+from state import address_id
+
+A, B = "Marszałkowska 1", "Puławska 10"
+
+def quiet(msg):
+    pass
+
+def day(offset):
+    return datetime.date.today() + datetime.timedelta(days=offset)
+
+def text(d):
+    # Format liczbowy z rokiem - nie zależy od reguły wyboru roku
+    return d.strftime("%d.%m.%Y")
+
+@pytest.fixture(autouse=True)
+def _fresh_calendar_cache():
+    calendar_sync._calendar_id_cache.clear()
+    yield
+    calendar_sync._calendar_id_cache.clear()
+
+def summaries(service, owner=None):
+    return sorted((ev["start"]["date"], ev["summary"][len(calendar_sync.EVENT_SUMMARY_PREFIX):]) for ev in service._events.values()
+                  if owner is None or event_owner(ev) == owner)
+
+def test_inserts_patches_and_deletes_only_differences():
+    stale = event_body("Papier", day(3).isoformat(), address_id(A))
+    stale["colorId"] = "1"
+    moved = event_body("Bio", day(4).isoformat(), address_id(A))
+    service = FakeCalendarService([stale, moved])
+    schedule = [(text(day(3)), "Papier"), (text(day(5)), "Bio"), (text(day(6)), "Szkło")]
+
+    stats, mirror = sync_calendar(service, schedule, ["Papier", "Bio", "Szkło"], quiet, address=A)
+    assert (stats["inserted"], stats["updated"], stats["deleted"]) == (2, 1, 1)
+    assert stats["full_read"]
+    assert summaries(service) == [(day(3).isoformat(), "Papier"), (day(5).isoformat(), "Bio"), (day(6).isoformat(), "Szkło")]
+    assert all(event_owner(ev) == address_id(A) for ev in service._events.values())
+    # calendarList + events.list + jeden batch
+    assert stats["requests"] == service.http_calls == 3
+
+def test_second_sync_reads_changes_by_sync_token():
+    service = FakeCalendarService()
+    schedule = [(text(day(2)), "Papier"), (text(day(9)), "Zmieszane")]
+    stats, mirror = sync_calendar(service, schedule, ["Papier", "Zmieszane"], quiet, address=A)
+    assert stats["inserted"] == 2
+    calls = service.http_calls
+
+    stats, mirror = sync_calendar(service, schedule, ["Papier", "Zmieszane"], quiet, cached_calendar_id=stats["calendar_id"], mirror=mirror, address=A)
+    assert not stats["full_read"]
+    assert (stats["inserted"], stats["updated"], stats["deleted"], stats["unchanged"]) == (0, 0, 0, 2)
+    # Tylko events.list z syncToken - bez calendarList i bez batcha
+    assert stats["requests"] == service.http_calls - calls == 1
+
+def test_addresses_sharing_calendar_do_not_delete_each_other():
+    service = FakeCalendarService()
+    stats, mirror = sync_calendar(service, [(text(day(3)), "Papier")], ["Papier"], quiet, address=A)
+    stats, mirror = sync_calendar(service, [(text(day(10)), "Papier")], ["Papier"], quiet, mirror=mirror, address=B)
+    assert (stats["inserted"], stats["deleted"]) == (1, 0)
+    assert summaries(service, address_id(A)) == [(day(3).isoformat(), "Papier")]
+    assert summaries(service, address_id(B)) == [(day(10).isoformat(), "Papier")]
+
+    # Przesunięty termin A usuwa tylko stare wydarzenie A
+    stats, mirror = sync_calendar(service, [(text(day(4)), "Papier")], ["Papier"], quiet, mirror=mirror, address=A)
+    assert (stats["inserted"], stats["deleted"]) == (1, 1)
+    assert summaries(service) == [(day(4).isoformat(), "Papier"), (day(10).isoformat(), "Papier")]
+
+def test_untagged_events_are_adopted_or_left_alone():
+    manual = {"summary": calendar_sync.EVENT_SUMMARY_PREFIX + "Papier", "start": {"date": day(8).isoformat()}, "end": {"date": day(8).isoformat()}}
+    legacy = event_body("Papier", day(3).isoformat())
+    service = FakeCalendarService([manual, legacy])
+
+    stats, _ = sync_calendar(service, [(text(day(3)), "Papier")], ["Papier"], quiet, address=A)
+    # Wydarzenie ze starszej wersji (bez właściciela) zostaje przejęte, ręczne - nietknięte
+    assert (stats["inserted"], stats["updated"], stats["deleted"]) == (0, 1, 0)
+    assert summaries(service) == [(day(3).isoformat(), "Papier"), (day(8).isoformat(), "Papier")]
+    assert summaries(service, address_id(A)) == [(day(3).isoformat(), "Papier")]
+
+def test_failed_batch_operations_are_counted():
+    service = FakeCalendarService()
+    service.failures = 1
+    schedule = [(text(day(2)), "Papier"), (text(day(9)), "Zmieszane")]
+    stats, mirror = sync_calendar(service, schedule, ["Papier", "Zmieszane"], quiet, address=A)
+    assert (stats["inserted"], stats["errors"]) == (1, 1)
+
+    # Kolejny przebieg dosyła brakujące wydarzenie
+    stats, _ = sync_calendar(service, schedule, ["Papier", "Zmieszane"], quiet, mirror=mirror, address=A)
+    assert (stats["inserted"], stats["errors"]) == (1, 0)
+    assert len(summaries(service, address_id(A))) == 2
+
+def test_parallel_first_sync_creates_one_calendar():
+    service = FakeCalendarService(calendar_name="Prywatny 2", latency=0.05)
+    results = []
+    def run(address):
+        results.append(sync_calendar(service, [(text(day(3)), "Papier")], ["Papier"], quiet, user="kowalscy", address=address)[0])
+    threads = [threading.Thread(target=run, args=(address,)) for address in (A, B)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert service.calendar_inserts == 1
+    assert {stats["calendar_id"] for stats in results} == {service.calendar_id}
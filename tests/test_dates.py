@@ -0,0 +1,33 @@
+import datetime
+
+import pytest
+
+from dates import parse_polish_date, parse_polish_dates
+
+D = datetime.date
+
+@pytest.mark.parametrize("text, today, expected", [
+    ("12 lipca", D(2026, 1, 10), D(2026, 7, 12)),
+    ("Wtorek, 15 grudnia", D(2026, 6, 15), D(2026, 12, 15)),
+    ("28 grudnia", D(2026, 1, 10), D(2025, 12, 28)),
+    ("5 stycznia", D(2026, 12, 20), D(2027, 1, 5)),
+    ("10 października", D(2026, 10, 18), D(2026, 10, 10)),
+    ("15 czerwca", D(2026, 6, 16), D(2026, 6, 15)),
+    ("15 kwietnia", D(2026, 6, 16), D(2027, 4, 15)),
+    ("29 lutego", D(2026, 10, 18), D(2028, 2, 29)),
+    ("15.07", D(2026, 1, 10), D(2026, 7, 15)),
+    ("12 lipca 2025", D(2026, 1, 10), D(2025, 7, 12)),
+])
+def test_year_is_chosen_forward(text, today, expected):
+    assert parse_polish_date(text, today) == expected
+
+def test_range_and_year_end_groups():
+    today = D(2026, 12, 20)
+    assert parse_polish_dates("30 grudnia - 2 stycznia", today) == (D(2026, 12, 30),)
+    assert parse_polish_dates("29 grudnia i 5 stycznia", today) == (D(2026, 12, 29), D(2027, 1, 5))
+    assert parse_polish_dates("15 grudnia i 12 stycznia 2025", today) == (D(2024, 12, 15), D(2025, 1, 12))
+
+def test_invalid_dates_are_skipped():
+    assert parse_polish_dates("31 lutego", D(2026, 1, 10)) == ()
+    assert parse_polish_dates("brak odbioru", D(2026, 1, 10)) == ()
+    assert parse_polish_dates(None) == ()
@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+
+import ics_feed
+from ics_feed import IcsFeedCache, _escape, _fold, render_ics
+from state import address_id
+
+ADDRESS = "Marszałkowska 1"
+
+def day(offset):
+    return datetime.date.today() + datetime.timedelta(days=offset)
+
+def entries(*pairs):
+    return [{"dateText": d.strftime("%d.%m.%Y"), "wasteType": waste_type} for d, waste_type in pairs]
+
+def uids(body):
+    return [line[4:] for line in body.decode("utf-8").split("\r\n") if line.startswith("UID:")]
+
+def save(store, schedule, fingerprint):
+    store.record_run({"status": "success", "saved_address": ADDRESS, "allowed_types": None, "schedule": schedule, "schedule_fingerprint": fingerprint})
+
+# --- GENEROWANIE ICS ---
+
+def test_escape_special_characters():
+    assert _escape("Szkło, papier; metal\\plastik\nbio") == "Szkło\\, papier\\; metal\\\\plastik\\nbio"
+
+def test_fold_keeps_lines_within_75_octets_without_splitting_characters():
+    line = "SUMMARY:" + "Wywóz: żółć, źdźbło, gęś, ślęża - " * 8
+    folded = _fold(line)
+    parts = folded.split("\r\n")
+    assert len(parts) > 1
+    assert all(len(part.encode("utf-8")) <= 75 for part in parts)
+    assert all(part.startswith(" ") for part in parts[1:])
+    # Rozwinięcie (RFC 5545: CRLF + spacja) oddaje pierwotną linię
+    assert folded.replace("\r\n ", "") == line
+    assert _fold("SUMMARY:Papier") == "SUMMARY:Papier"
+
+def test_uids_are_stable_across_renders():
+    schedule = entries((day(3), "Papier"), (day(3), "Szkło"), (day(10), "Papier"))
+    first = render_ics(ADDRESS, schedule, stamp=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc))
+    second = render_ics(ADDRESS, list(reversed(schedule)), stamp=datetime.datetime(2026, 2, 1, tzinfo=datetime.timezone.utc))
+    assert first != second  # inny DTSTAMP
+    assert uids(first) == uids(second)
+    assert len(set(uids(first))) == 3
+    assert not set(uids(first)) & set(uids(render_ics("Puławska 10", schedule)))
+
+def test_allowed_types_filter_events():
+    body = render_ics(ADDRESS, entries((day(3), "Papier"), (day(4), "Szkło")), allowed_types=["Szkło"])
+    assert body.count(b"BEGIN:VEVENT") == 1
+    assert "CATEGORIES:Szkło".encode("utf-8") in body and b"CATEGORIES:Papier" not in body
+
+# --- CACHE I ODPOWIEDZI HTTP ---
+
+@pytest.fixture
+def feed(webapp):
+    save(webapp.state_store, entries((day(3), "Papier"), (day(5), "Szkło")), "odcisk-1")
+    return f"/ics/{address_id(ADDRESS)}.ics"
+
+def test_feed_has_etag_and_last_modified(client, feed):
+    resp = client.get(feed)
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/calendar"
+    assert resp.headers["ETag"] and resp.headers["Last-Modified"]
+    assert resp.data.count(b"BEGIN:VEVENT") == 2
+
+def test_feed_not_modified_for_matching_etag(client, feed):
+    etag = client.get(feed).headers["ETag"]
+    resp = client.get(feed, headers={"If-None-Match": etag})
+    assert resp.status_code == 304 and not resp.data
+
+def test_feed_not_modified_since_last_modified(client, feed):
+    last_modified = client.get(feed).headers["Last-Modified"]
+    resp = client.get(feed, headers={"If-Modified-Since": last_modified})
+    assert resp.status_code == 304
+
+def test_unknown_address_is_404(client):
+    assert client.get("/ics/nieznany.ics").status_code == 404
+
+def test_disk_copy_is_used_after_memory_is_cleared(webapp, feed, tmp_path, monkeypatch):
+    cache = IcsFeedCache(str(tmp_path / "ics"), 10)
+    first = cache.get(address_id(ADDRESS))
+    cache._memory.clear()
+    monkeypatch.setattr(ics_feed, "render_ics", lambda *a, **kw: pytest.fail("kanał renderowany ponownie zamiast odczytu z dysku"))
+    second = cache.get(address_id(ADDRESS))
+    assert (second["body"], second["etag"], second["last_modified"]) == (first["body"], first["etag"], first["last_modified"])
+    # Nowa instancja (restart serwera) też czyta z dysku
+    assert IcsFeedCache(str(tmp_path / "ics"), 10).get(address_id(ADDRESS))["etag"] == first["etag"]
+
+def test_feed_is_rendered_again_when_fingerprint_changes(webapp, client, feed):
+    old = client.get(feed)
+    save(webapp.state_store, entries((day(3), "Papier"), (day(5), "Szkło"), (day(12), "Bio")), "odcisk-2")
+    resp = client.get(feed, headers={"If-None-Match": old.headers["ETag"]})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != old.headers["ETag"]
+    assert resp.data.count(b"BEGIN:VEVENT") == 3
@@ -0,0 +1,127 @@
+import json
+import time
+import threading
+
+import pytest
+
+from config import JOB_THROUGHPUT_WINDOW
+from progress import update_progress
+
+A, B = "Marszałkowska 1", "Puławska 10"
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "przekroczony czas oczekiwania"
+        time.sleep(0.01)
+
+class FakeRun:
+    """run_full_process, który melduje postęp i czeka na gate - zadanie zostaje "running", dopóki test go nie puści."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+
+    def __call__(self, address, allowed_types, force=False, user=None, calendar=True):
+        self.calls.append((address, allowed_types))
+        update_progress(50, f"Pobieranie harmonogramu: {address}")
+        self.gate.wait(5)
+        return {"status": "success", "run_id": len(self.calls)}
+
+@pytest.fixture
+def run(webapp, monkeypatch):
+    fake = FakeRun()
+    monkeypatch.setattr(webapp, "run_full_process", fake)
+    yield fake
+    fake.gate.set()
+
+@pytest.fixture
+def jobs(webapp, run, monkeypatch):
+    monkeypatch.setattr(webapp, "job_queue", webapp.JobQueue(1))
+    return webapp.job_queue
+
+def sse_events(chunks):
+    """[(event, data)] ze strumienia SSE (bez komentarzy heartbeat)."""
+    events = []
+    for block in "".join(chunk.decode("utf-8") for chunk in chunks).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields: events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+# --- KOLEJKA ---
+
+def test_duplicate_jobs_are_merged_while_queued_or_running(jobs, run):
+    running, created = jobs.submit(A, ["Papier", "Szkło"])
+    assert created
+    wait_for(lambda: running.status == "running")
+    # Ten sam adres i rodzaje (w innej kolejności) - scalone z trwającym zadaniem
+    assert jobs.submit(A, ["Szkło", "Papier"]) == (running, False)
+
+    queued, created = jobs.submit(B, ["Papier"])
+    assert created and queued.status == "queued"
+    assert jobs.submit(B, ["Papier"]) == (queued, False)
+    # Inne rodzaje albo tryb bez Kalendarza to osobne zadania
+    assert jobs.submit(A, ["Papier"])[1]
+    assert jobs.submit(B, ["Papier"], calendar=False)[1]
+
+    run.gate.set()
+    wait_for(lambda: jobs.stats()["processed_total"] == 4)
+    assert len(run.calls) == 4
+    # Po zakończeniu ten sam klucz tworzy nowe zadanie
+    again, created = jobs.submit(A, ["Papier", "Szkło"])
+    assert created and again is not running
+
+def test_stats_report_throughput_and_duration(jobs, run):
+    run.gate.set()
+    for address in (A, B, "Grójecka 5"): jobs.submit(address, ["Papier"])
+    wait_for(lambda: jobs.stats()["processed_total"] == 3)
+    # Zakończenie sprzed okna nie liczy się do przepustowości
+    jobs._finished_times.appendleft(time.time() - JOB_THROUGHPUT_WINDOW - 5)
+    stats = jobs.stats()
+    assert (stats["workers"], stats["queued"], stats["running"]) == (1, 0, 0)
+    assert stats["throughput_per_min"] == round(3 / (JOB_THROUGHPUT_WINDOW / 60), 3)
+    assert stats["avg_duration_s"] is not None and stats["avg_duration_s"] >= 0
+
+# --- POSTĘP ---
+
+def test_progress_by_job_id(client, jobs, run):
+    job, _ = jobs.submit(A, ["Papier"])
+    wait_for(lambda: job.percent == 50)
+    resp = client.get(f"/api/progress/{job.id}")
+    assert resp.status_code == 200
+    assert (resp.json["id"], resp.json["status"], resp.json["percent"]) == (job.id, "running", 50)
+
+    run.gate.set()
+    wait_for(lambda: job.finished_at is not None)
+    resp = client.get(f"/api/progress/{job.id}")
+    assert (resp.json["status"], resp.json["result"]["run_id"]) == ("finished", 1)
+
+def test_progress_of_unknown_job_is_404(client, jobs, run):
+    assert client.get("/api/progress/nieznane").status_code == 404
+    assert client.get("/api/progress/nieznane/stream").status_code == 404
+
+def test_progress_stream_sends_snapshot_backlog_and_done(client, jobs, run):
+    job, _ = jobs.submit(A, ["Papier"])
+    wait_for(lambda: job.percent == 50)
+    resp = client.get(f"/api/progress/{job.id}/stream", buffered=False)
+    assert resp.mimetype == "text/event-stream"
+    chunks = iter(resp.response)
+    # Bieżący stan, potem bufor: start workera i meldunek 50%
+    head = sse_events([next(chunks) for _ in range(3)])
+    assert head[0] == ("progress", {"percent": 50, "message": job.message, "status": "running", "job_id": job.id})
+    assert [data["percent"] for _, data in head[1:]] == [0, 50]
+
+    run.gate.set()
+    events = sse_events(list(chunks))
+    assert events[-1][0] == "done"
+    assert (events[-1][1]["status"], events[-1][1]["run_id"]) == ("finished", 1)
+    resp.close()
+
+def test_progress_stream_of_finished_job_resumes_after_last_event_id(client, jobs, run):
+    run.gate.set()
+    job, _ = jobs.submit(A, ["Papier"])
+    wait_for(lambda: job.finished_at is not None)
+    # Zdarzenia: 1 - start, 2 - 50%, 3 - done; po Last-Event-ID: 2 tylko stan i done
+    events = sse_events(client.get(f"/api/progress/{job.id}/stream", headers={"Last-Event-ID": "2"}).response)
+    assert [event for event, _ in events] == ["progress", "done"]
+    assert events[0][1]["status"] == "finished"
@@ -0,0 +1,119 @@
+import os
+import sys
+import random
+import subprocess
+
+import fitz
+import pytest
+
+from fixtures import make_schedule_pdf, dense_icons
+from pdf_labels import PDF_LEGEND, PdfCache, classify_icons, find_matching_fraction, layout_labels, make_text_width
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_classify_icons_matches_find_matching_fraction(tmp_path, seed):
+    path = make_schedule_pdf(str(tmp_path / "harmonogram.pdf"), pages=2, icons_per_page=120, seed=seed)
+    doc = fitz.open(path)
+    try:
+        checked = 0
+        for page in doc:
+            pix = page.get_pixmap()
+            # Wszystkie obrazy strony, także poza zakresem rozmiarów ikon i przy krawędziach
+            bboxes = [fitz.Rect(img["bbox"]) for img in page.get_image_info(xrefs=True)]
+            bboxes.append(fitz.Rect(pix.width - 3, pix.height - 3, pix.width + 10, pix.height + 10))
+            expected = [find_matching_fraction(pix, bbox, PDF_LEGEND) for bbox in bboxes]
+            assert classify_icons(pix, bboxes) == expected
+            checked += len(bboxes)
+        assert checked > 200
+    finally:
+        doc.close()
+
+def test_classify_icons_custom_legend(tmp_path):
+    path = make_schedule_pdf(str(tmp_path / "harmonogram.pdf"), pages=1, icons_per_page=60, seed=7)
+    legend = [{"name": "NIEBIESKI", "color": (0, 95, 170)}, {"name": "ZIELONY", "color": (45, 160, 45)}]
+    doc = fitz.open(path)
+    try:
+        page = doc[0]
+        pix = page.get_pixmap()
+        bboxes = [fitz.Rect(img["bbox"]) for img in page.get_image_info(xrefs=True)]
+        assert classify_icons(pix, bboxes, legend) == [find_matching_fraction(pix, bbox, legend) for bbox in bboxes]
+    finally:
+        doc.close()
+
+def reference_layout(icons, text_width):
+    """Pierwotna pętla z write_page_labels (przed indeksem wierszy): każda kolizja sprawdzana ze wszystkimi ikonami strony."""
+    page_icons = [{"rect": rect, "label": lbl} for rect, lbl in icons]
+    placements = []
+    for icon in page_icons:
+        if icon["label"] == "SKIP": continue
+        txt = icon["label"]
+        tlen = text_width(txt)
+        right = icon["rect"].x0 - 5
+        collision = True
+        while collision:
+            collision = False
+            trect = fitz.Rect(right - tlen, icon["rect"].y0, right, icon["rect"].y1)
+            for obs in page_icons:
+                if obs is icon: continue
+                if trect.intersects(obs["rect"]):
+                    right = obs["rect"].x0 - 5; collision = True; break
+        placements.append((txt, right - tlen, icon["rect"].y1 - 2))
+    return placements
+
+def test_layout_labels_matches_reference_loop():
+    text_width = make_text_width()
+    rnd = random.Random(12)
+    for seed in range(300):
+        icons = dense_icons(rnd.randint(1, 80), rows=rnd.randint(1, 30), seed=seed)
+        # Także prostokąty puste i zdegenerowane (zerowa szerokość/wysokość)
+        for _ in range(rnd.randint(0, 3)):
+            x, y = rnd.uniform(0, 500), rnd.uniform(0, 800)
+            icons.insert(rnd.randrange(len(icons) + 1), (fitz.Rect(x, y, x + rnd.choice([0, 10]), y + rnd.choice([0, 10])), "PAPIER"))
+        assert layout_labels(icons, text_width) == reference_layout(icons, text_width), seed
+
+def test_parallel_labels_match_serial(tmp_path):
+    from pdf_labels import process_pdf_labels
+    src = make_schedule_pdf(str(tmp_path / "harmonogram.pdf"), pages=4, icons_per_page=40, seed=5)
+    serial, parallel = str(tmp_path / "serial.pdf"), str(tmp_path / "parallel.pdf")
+    assert process_pdf_labels(src, serial, workers=1)
+    assert process_pdf_labels(src, parallel, workers=2)
+    with open(serial, "rb") as a, open(parallel, "rb") as b: assert a.read() == b.read()
+
+def test_pdf_cache_creates_directory_on_first_store(tmp_path):
+    directory = tmp_path / "pdf_cache"
+    cache = PdfCache(str(directory), 10 * 1024 * 1024, 86400)
+    assert not directory.exists()
+    assert not cache.fetch("klucz", str(tmp_path / "wynik.pdf"))
+    cache.evict()
+    assert not directory.exists()
+
+    source = make_schedule_pdf(str(tmp_path / "opisany.pdf"), pages=1, icons_per_page=5)
+    cache.store("klucz", source)
+    assert cache.fetch("klucz", str(tmp_path / "wynik.pdf"))
+    assert (tmp_path / "wynik.pdf").read_bytes() == (tmp_path / "opisany.pdf").read_bytes()
+
+# Skrypt uruchamiany jak `python app.py`: importuje aplikację w module __main__, który procesy puli
+# (forkserver/spawn) importują ponownie jako __mp_main__
+POOL_PROBE = """
+import sys, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+sys.path.insert(0, {root!r})
+import app
+from pdf_labels import POOL_START_METHOD
+
+def probe():
+    return sorted(t.name for t in threading.enumerate()), app.wake_scheduler._thread is None
+
+if __name__ == "__main__":
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context(POOL_START_METHOD)) as pool:
+        names, idle = pool.submit(probe).result()
+    print("wake-scheduler" in names, idle, app.wake_scheduler._thread is None)
+"""
+
+def test_pool_worker_does_not_start_background_threads(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = tmp_path / "serwer.py"
+    script.write_text(POOL_PROBE.format(root=root), encoding="utf-8")
+    out = subprocess.run([sys.executable, str(script)], cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    # Ani worker puli, ani sam import w procesie głównym nie uruchamia automatu
+    assert out.stdout.strip().splitlines()[-1].split() == ["False", "True", "True"]
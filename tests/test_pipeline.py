@@ -0,0 +1,10 @@
+from pipeline import schedule_fingerprint
+
+SCHEDULE = [("15.01.2030", "Papier"), ("16.01.2030", "Bio")]
+
+def test_fingerprint_depends_on_user_and_calendar():
+    base = schedule_fingerprint(SCHEDULE, ["Papier", "Bio"])
+    assert schedule_fingerprint(SCHEDULE, ["Bio", "Papier"]) == base
+    assert schedule_fingerprint(SCHEDULE, ["Papier", "Bio"], user="kowalscy") != base
+    assert schedule_fingerprint(SCHEDULE, ["Papier", "Bio"], user="kowalscy") != schedule_fingerprint(SCHEDULE, ["Papier", "Bio"], user="nowakowie")
+    assert schedule_fingerprint(SCHEDULE, ["Papier", "Bio"], calendar=False) != base
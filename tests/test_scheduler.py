@@ -0,0 +1,83 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import scheduler
+from scheduler import WakeScheduler
+from state import StateStore
+
+ADDRESS = "Marszałkowska 1"
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = StateStore(str(tmp_path / "state.db"))
+    store.set_settings(auto_mode=True)
+    monkeypatch.setattr(scheduler, "state_store", store)
+    return store
+
+def record(store, user=None, **extra):
+    pickup = datetime.date.today() + datetime.timedelta(days=3)
+    store.record_run({"status": "success", "saved_address": ADDRESS, "allowed_types": ["Papier"], "user": user,
+                      "schedule": [{"dateText": pickup.strftime("%d.%m.%Y"), "wasteType": "Papier"}], **extra})
+
+def test_plan_carries_household_of_last_run(store):
+    record(store, user="kowalscy")
+    wake = WakeScheduler(lambda *args: None)
+    entry = wake.plan(ADDRESS)
+    assert entry["user"] == "kowalscy"
+    assert [e["user"] for e in wake.upcoming()] == ["kowalscy"]
+
+    wake.reload()
+    assert wake.upcoming()[0]["user"] == "kowalscy"
+
+def test_due_entry_keeps_user(store):
+    record(store, user="kowalscy")
+    wake = WakeScheduler(lambda *args: None)
+    entry = wake.plan(ADDRESS)
+    wake._push(entry["address"], entry["allowed_types"], datetime.datetime.now() - datetime.timedelta(seconds=1), "test", entry["user"])
+    due = wake._pop_due()
+    assert (due["address"], due["allowed_types"], due["user"], due["calendar"]) == (ADDRESS, ["Papier"], "kowalscy", True)
+    assert wake.upcoming() == []
+
+def test_ics_only_address_stays_ics_only(store):
+    record(store, calendar=False)
+    wake = WakeScheduler(lambda *args: None)
+    assert wake.plan(ADDRESS)["calendar"] is False
+    record(store)
+    assert wake.plan(ADDRESS)["calendar"] is True
+
+def test_failed_run_is_retried_instead_of_waiting_for_next_pickup(store):
+    today = datetime.date.today()
+    fmt = lambda d: d.strftime("%d.%m.%Y")
+    success = datetime.datetime.combine(today - datetime.timedelta(days=1), datetime.time(6, 30))
+    failed = datetime.datetime.combine(today, datetime.time(6, 30))
+    stamp = lambda t: t.strftime("%Y-%m-%d %H:%M:%S")
+    schedule = [{"dateText": fmt(today - datetime.timedelta(days=1)), "wasteType": "Papier"}, {"dateText": fmt(today + datetime.timedelta(days=5)), "wasteType": "Szkło"}]
+    store.record_run({"status": "success", "saved_address": ADDRESS, "allowed_types": ["Papier", "Szkło"], "schedule": schedule, "timestamp": stamp(success)})
+    store.record_run({"status": "error", "saved_address": ADDRESS, "message": "Brak dat na stronie", "timestamp": stamp(failed)})
+
+    wake = WakeScheduler(lambda *args: None)
+    entry = wake.plan(ADDRESS, now=failed + datetime.timedelta(minutes=10))
+    assert entry["due"] == failed + datetime.timedelta(minutes=scheduler.AUTO_RETRY_MINUTES)
+    assert entry["reason"] == "ponowna próba po nieudanym przebiegu"
+    assert entry["allowed_types"] == ["Papier", "Szkło"]
+
+    # Po udanym przebiegu termin znowu wynika z harmonogramu
+    store.record_run({"status": "success", "saved_address": ADDRESS, "allowed_types": ["Papier", "Szkło"], "schedule": schedule,
+                      "timestamp": stamp(failed + datetime.timedelta(hours=1))})
+    entry = wake.plan(ADDRESS, now=failed + datetime.timedelta(hours=1, minutes=1))
+    assert entry["due"].date() == today + datetime.timedelta(days=6)
+    assert entry["reason"] == f"po odbiorze {(today + datetime.timedelta(days=5)).isoformat()}"
+
+def test_existing_database_gets_new_columns(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE schedules (address_key TEXT PRIMARY KEY, address TEXT NOT NULL, schedule TEXT NOT NULL, allowed_types TEXT, "
+                 "pdf_available INTEGER DEFAULT 0, pdf_labeled_available INTEGER DEFAULT 0, pdf_url TEXT, pdf_labeled_url TEXT, fingerprint TEXT, updated_at TEXT)")
+    conn.commit()
+    conn.close()
+    store = StateStore(path)
+    record(store, user="nowakowie")
+    item = store.list_schedules()[0]
+    assert (item["user"], item["calendar"]) == ("nowakowie", True)
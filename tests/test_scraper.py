@@ -0,0 +1,84 @@
+import datetime
+from contextlib import nullcontext
+
+import pytest
+
+import scraper
+from fixtures import SiteStandIn, load_recorded, make_schedule_pdf, rebase_dates
+from config import WASTE_COLORS
+
+def no_step(name):
+    return nullcontext()
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    pdf = make_schedule_pdf(str(tmp_path / "miasto.pdf"), pages=1, icons_per_page=10)
+    stand_in = SiteStandIn(pdf).start()
+    monkeypatch.setattr(scraper, "SCRAPER_BASE_URL", stand_in.url)
+    monkeypatch.setattr(scraper, "_http_session", None)
+    monkeypatch.setattr(scraper, "_portal_cookies", None)
+    yield stand_in
+    stand_in.stop()
+
+def test_http_scraper_fetches_dates_and_pdf(site, tmp_path):
+    target = str(tmp_path / "harmonogram.pdf")
+    schedule, pdf_ok = scraper.HttpScraper().fetch("Marszałkowska 1", target, lambda msg: None, no_step)
+
+    expected = scraper.parse_http_schedule(rebase_dates(load_recorded("schedule.json")))
+    assert schedule == expected
+    assert {waste for _, waste in schedule} <= set(WASTE_COLORS)
+    today = datetime.date.today()
+    for text, _ in schedule:
+        day, month, year = text.split()
+        assert datetime.date(int(year), scraper.MONTH_GENITIVE.index(month) + 1, int(day)) >= today
+    assert pdf_ok
+    with open(target, "rb") as f: assert f.read() == site.pdf_bytes
+
+def test_http_scraper_without_pdf_target(site):
+    schedule, pdf_ok = scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    assert schedule and not pdf_ok
+    assert site.requests == 3  # strona, podpowiedzi, harmonogram - bez PDF
+
+def test_http_scraper_retries_post(site):
+    scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    site.failures = 1  # następne żądanie to POST podpowiedzi adresu
+    schedule, _ = scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    assert schedule
+
+def test_http_scraper_reuses_cookies_of_previous_fetch(site):
+    scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    assert scraper._portal_cookies
+    before = site.requests
+    scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    assert site.requests - before == 2  # bez strony głównej portalu
+
+def test_http_scraper_drops_cookies_after_failure(site):
+    scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    assert scraper._portal_cookies
+    site.failures = 10
+    with pytest.raises(Exception):
+        scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    assert scraper._portal_cookies is None
+    site.failures = 0
+    before = site.requests
+    assert scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)[0]
+    assert site.requests - before == 3  # znowu od strony głównej portalu
+
+def test_failed_fetch_keeps_cookies_of_other_jobs(site, monkeypatch):
+    scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    stale = scraper._portal_cookies
+    real_fetch = scraper.HttpScraper._fetch
+
+    def failing_fetch(self, sess, *args):
+        # W trakcie tego pobrania inne zadanie kończy się sukcesem z nowymi ciasteczkami
+        fresh = scraper.HttpScraper()
+        fresh._fetch = lambda *a: real_fetch(fresh, *a)
+        fresh.fetch("Puławska 10", None, lambda msg: None, no_step)
+        assert sess.cookies is not scraper._portal_cookies
+        raise Exception("Wygasła sesja portalu")
+
+    monkeypatch.setattr(scraper.HttpScraper, "_fetch", failing_fetch)
+    with pytest.raises(Exception, match="Wygasła"):
+        scraper.HttpScraper().fetch("Marszałkowska 1", None, lambda msg: None, no_step)
+    # Błąd dotyczył starych ciasteczek - nowsze, zapisane przez drugie zadanie, zostają
+    assert scraper._portal_cookies is not None and scraper._portal_cookies is not stale